@@ -0,0 +1,55 @@
+'''
+Benchmark of ItemStore id validation and extraction in ion.itemstore
+Usage:
+    python -m benchmarks.itemstore_ids [ids_no]
+'''
+import random
+import uuid
+import sys
+
+from ion.benchmark import Measure
+from ion.itemstore import is_valid_id, are_valid_ids, find_ids
+
+
+def item_ids(ids_no: int, seed: int = 0) -> list:
+    '''Generate ids_no uuid4 ids, every tenth of them truncated (and so invalid)'''
+    rand = random.Random(seed)
+    ids = [str(uuid.UUID(int=rand.getrandbits(128), version=4)) for _ in range(ids_no)]
+    return [_id[:-1] if no % 10 == 0 else _id for no, _id in enumerate(ids)]
+
+def log_text(ids: list) -> str:
+    '''Build access log lines mentioning ids'''
+    return '\n'.join(f'GET /articles/{_id}?fields=title 200 {len(_id)}ms' for _id in ids)
+
+def measure(name: str, func, *args, count: int):
+    '''Print time it takes to call func(*args) once'''
+    _measure = Measure()
+    with _measure:
+        func(*args)
+    print(f'{name:32s}{_measure.elapsed:8.3f}s {_measure.elapsed / count * 1e6:8.3f}us/id')
+
+def run(ids_no: int = 500000):
+    '''Time are_valid_ids against is_valid_id, and find_ids against splitting a log into words'''
+    ids = item_ids(ids_no)
+    measure('[is_valid_id(i) for i in ids]', lambda: [is_valid_id(_id) for _id in ids], count=ids_no)
+    measure('are_valid_ids(list)', are_valid_ids, ids, count=ids_no)
+    try:
+        import numpy as np
+    except ImportError:
+        print('NumPy is not installed, skipping are_valid_ids(np.array)')
+    else:
+        array = np.array(ids)
+        measure('are_valid_ids(np.array)', are_valid_ids, array, count=ids_no)
+    text = log_text(ids)
+    print(f'{len(text) / 2 ** 20:.1f}MB of log text')
+    measure(
+        'split + is_valid_id',
+        lambda: [word for word in text.replace('/', ' ').replace('?', ' ').split() if is_valid_id(word)],
+        count=ids_no
+    )
+    measure('find_ids', find_ids, text, count=ids_no)
+    measure('find_ids(bytes)', find_ids, text.encode(), count=ids_no)
+
+
+if __name__ == '__main__':
+    run(*map(int, sys.argv[1:]))
@@ -0,0 +1,53 @@
+'''
+Benchmark of building ItemStore models in ion.itemstore
+Usage:
+    python -m benchmarks.itemstore_models [publications_no] [domains_no]
+'''
+import tracemalloc
+import gc
+import sys
+
+from ion.benchmark import Measure
+from ion.itemstore import Publication, CompactPublication
+
+SECTIONS = ('news', 'sport', 'whats-on')
+
+
+def publication_dicts(publications_no: int, domains_no: int) -> list:
+    '''Generate publications_no publication dicts with 3 sections each, spread over domains_no domains'''
+    return [
+        {
+            'name': f'publication-{no}',
+            'domain': f'https://www.publisher{no % domains_no}.co.uk/',
+            'publisher': f'publisher-{no % domains_no}',
+            'sections': [
+                {'url': f'https://www.publisher{no % domains_no}.co.uk/{section}?page=1', 'job': {}}
+                for section in SECTIONS
+            ]
+        }
+        for no in range(publications_no)
+    ]
+
+def measure(name: str, build, dicts: list):
+    '''Print time it takes to build models out of dicts and memory they take'''
+    gc.collect()
+    tracemalloc.start()
+    _measure = Measure()
+    with _measure:
+        models = build(dicts)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{name:32s}{_measure.elapsed:8.3f}s {size / 2 ** 20:8.1f}MB')
+    del models
+
+def run(publications_no: int = 50000, domains_no: int = 1000):
+    '''Time and measure memory of Publication(**d) against Publication.from_dicts and CompactPublication.from_dicts'''
+    dicts = publication_dicts(publications_no, domains_no)
+    print(f'{publications_no} publications with {len(SECTIONS)} sections each over {domains_no} domains')
+    measure('Publication(**d)', lambda dicts: [Publication(**dct) for dct in dicts], dicts)
+    measure('Publication.from_dicts', Publication.from_dicts, dicts)
+    measure('CompactPublication.from_dicts', CompactPublication.from_dicts, dicts)
+
+
+if __name__ == '__main__':
+    run(*map(int, sys.argv[1:]))
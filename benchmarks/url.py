@@ -0,0 +1,116 @@
+'''
+Benchmark of ion.url on a synthetic corpus of news article urls
+Usage:
+    python -m benchmarks.url [urls_no]
+'''
+from typing import List
+import random
+import sys
+import re
+
+from ion.benchmark import Measure
+from ion.url import (
+    URL_REGEX, SECOND_LEVEL_DOMAINS, parse, domain, iurl, iurl_many, domain_many,
+    query_to_dict, query_to_pairs, query_to_str,
+    enable_cache, disable_cache, cache_info, _split, _host_domain
+)
+
+HOSTS = [
+    'www.bbc.co.uk', 'www.theguardian.com', 'inyourarea.co.uk', 'www.manchestereveningnews.co.uk',
+    'news.sky.com', 'www.independent.co.uk', 'edition.cnn.com', 'www.nytimes.com',
+    'metro.co.uk', 'www.walesonline.co.uk'
+]
+SECTIONS = ['news', 'uk', 'politics', 'sport', 'local', 'world', 'business', '2019', '03', '14']
+WORDS = ['council', 'plans', 'new', 'school', 'road', 'closure', 'police', 'appeal']
+QUERIES = ['?utm_source=twitter&utm_medium=social&utm_campaign=sharebutton', '?page=2']
+
+
+def news_urls(urls_no: int, seed: int = 0) -> List[str]:
+    '''Generate urls_no urls looking like links to news articles'''
+    rand = random.Random(seed)
+    urls = []
+    for _ in range(urls_no):
+        sections = '/'.join(rand.choice(SECTIONS) for _ in range(rand.randint(1, 4)))
+        slug = '-'.join(rand.choice(WORDS) for _ in range(6))
+        url = f'{rand.choice(["https://", "http://", ""])}{rand.choice(HOSTS)}/{sections}/{slug}-{rand.randint(10**6, 10**8)}'
+        chance = rand.random()
+        if chance < 0.5:
+            url += QUERIES[chance >= 0.4]
+        if rand.random() < 0.1:
+            url += '#comments'
+        urls.append(url)
+    return urls
+
+def second_level_domain(host: str, level: int = 2) -> str:
+    '''Domain extraction as it was done before the public suffix list was used'''
+    split = host.split('.')
+    if len(split) >= 2 and split[-2] in SECOND_LEVEL_DOMAINS:
+        level += 1
+    level = min(level, len(split))
+    return '.'.join(split[-level:])
+
+def split_query_to_dict(query_str: str) -> dict:
+    '''Query parsing as it was done before query_to_pairs'''
+    if len(query_str) > 1:
+        return dict(q.split('=') for q in query_str[1:].split('&'))
+    return {}
+
+def measure_each(urls: List[str], *funcs):
+    '''Print time it takes to call each of (name, func) funcs on all urls'''
+    for name, func in funcs:
+        measure = Measure()
+        with measure:
+            for url in urls:
+                func(url)
+        print(f'{name:24s}{measure.elapsed:8.3f}s {measure.elapsed / len(urls) * 1e6:8.2f}us/url')
+
+def run(urls_no: int = 200000, distinct_no: int = 5000):
+    '''
+    Time ion.url functions against the URL_REGEX baseline
+    and then with the LRU cache on urls_no urls repeating distinct_no distinct urls
+    '''
+    urls = news_urls(urls_no)
+    compiled = re.compile(URL_REGEX)
+    measure_each(
+        urls,
+        ('re.search(URL_REGEX)', lambda url: re.search(URL_REGEX, url)),
+        ('compiled URL_REGEX', compiled.search),
+        ('_split', _split),
+        ('parse', parse),
+        ('parse as_dict', lambda url: parse(url, as_dict=True)),
+        ('domain', domain),
+        ('iurl', iurl),
+        ('iurl query=True', lambda url: iurl(url, query=True))
+    )
+    hosts = [parse(url, 'host') for url in urls]
+    domain(hosts[0])  # builds the public suffix trie
+    measure_each(
+        hosts,
+        ('SECOND_LEVEL_DOMAINS', second_level_domain),
+        ('public suffix trie', lambda host: _host_domain(host, 2))
+    )
+    queries = [query for query in (parse(url, 'query') for url in urls) if query]
+    measure_each(
+        queries,
+        ('split query_to_dict', split_query_to_dict),
+        ('query_to_dict', query_to_dict),
+        ('query_to_pairs', query_to_pairs),
+        ('query_to_pairs decode', lambda query: query_to_pairs(query, decode=True)),
+        ('query_to_str', lambda query: query_to_str(query_to_pairs(query)))
+    )
+    repeated = random.Random(0).choices(news_urls(distinct_no), k=urls_no)
+    print(f'{urls_no} urls with {distinct_no} distinct ones')
+    measure_each(repeated, ('domain', domain), ('iurl', iurl))
+    for name, func in (('domain_many', domain_many), ('iurl_many', iurl_many)):
+        measure = Measure()
+        with measure:
+            func(repeated)
+        print(f'{name:24s}{measure.elapsed:8.3f}s {measure.elapsed / urls_no * 1e6:8.2f}us/url')
+    enable_cache(distinct_no)
+    measure_each(repeated, ('cached domain', domain), ('cached iurl', iurl))
+    print(cache_info())
+    disable_cache()
+
+
+if __name__ == '__main__':
+    run(*map(int, sys.argv[1:]))
@@ -77,6 +77,8 @@ class DCDict:
     Overwrite this with a dataclass to gain access to to_dict() method
     that basically acts as a asdict(self)
     '''
+    __slots__ = ()
+
     def to_dict(self):
         '''Convert self dataclass to dict'''
         return asdict(self)
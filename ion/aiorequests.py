@@ -0,0 +1,178 @@
+'''Asynchronous counterpart of ion.requests built on aiohttp'''
+from typing import Iterable, List, Optional, Union
+import asyncio
+import logging
+
+import aiohttp
+
+from ._import import get_caller_module
+from .requests import Requests
+
+log = logging.getLogger(__name__)
+RETRY_METHODS = frozenset(('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS', 'TRACE'))
+
+
+class AsyncRequests:
+    '''
+    Wrapper class around aiohttp.ClientSession mimicking ion.requests.Requests,
+    which runs thousands of concurrent requests on a single event loop
+    Responses are returned with their body already read, so that their connection
+    goes straight back to the pool, while response.text(), .json() and .read() still work
+    Arguments:
+        max_retries:     how many times should a request be retried on bad status code
+        retry_on:        which codes should be added to default list of status codes on which
+                         retry is triggered
+                             default list: 400, 403, 500, 502, 503, 504
+        accept_on:       which codes should be removed from default list of status codes on which
+                         retry is triggered
+        raise_on_status: after the number of retries is greater than max_retries,
+                         should an error be thrown or rather a bad response returned
+        concurrency:     maximum number of requests (and open connections) at a time
+        limit_per_host:  maximum number of open connections to a single host (0 for no limit)
+        backoff_factor:  retry number n sleeps for backoff_factor * 2 ** (n - 1) seconds,
+                         without blocking other requests
+        timeout:         total timeout of a single request in seconds
+    Usage:
+        async with AsyncRequests(concurrency=500) as requests:
+            response = await requests.get('https://inyourarea.co.uk')
+            responses = await requests.gather_many(['https://inyourarea.co.uk', {'url': ..., 'params': ...}])
+    '''
+    DEFAULT_STATUS_FORCELIST = Requests.DEFAULT_STATUS_FORCELIST
+    CONNECTION_RETRIES = 2
+    BACKOFF_MAX = 120
+    def __init__(
+            self,
+            max_retries=5,
+            retry_on=(),
+            accept_on=(),
+            raise_on_status=False,
+            concurrency: int = 100,
+            limit_per_host: int = 0,
+            backoff_factor: float = 1,
+            timeout: Optional[float] = 300
+    ):
+        retry_on = self.DEFAULT_STATUS_FORCELIST.union(set(retry_on))
+        self.status_forcelist = frozenset(
+            status_code
+            for status_code in retry_on
+            if status_code not in set(accept_on)
+        )
+        self._caller_module = get_caller_module()
+        self.max_retries = max_retries
+        self.raise_on_status = raise_on_status
+        self.concurrency = concurrency
+        self.limit_per_host = limit_per_host
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def reset_session(self):
+        '''Closes self.session (if there is one) and opens a new one'''
+        log.info('Setting/Resetting session for AsyncRequests called from module %s', self._caller_module)
+        await self.close()
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.limit_per_host),
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def close(self):
+        '''Closes self.session and its connections'''
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        await self.reset_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def _backoff(self, retry: int, response: Optional[aiohttp.ClientResponse] = None) -> float:
+        '''Seconds to sleep before retry number retry (honouring the Retry-After header)'''
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return float(retry_after)
+        return min(self.backoff_factor * 2 ** (retry - 1), self.BACKOFF_MAX)
+
+    async def request(self, method: str, url: str, **kw) -> aiohttp.ClientResponse:
+        '''
+        Generic request method that makes an appropriate request based on request type
+        Keyword arguments are passed to aiohttp.ClientSession.request
+        '''
+        if self.session is None:
+            await self.reset_session()
+        method = method.upper()
+        retries = connection_retries = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    response = await self.session.request(method, url, **kw)
+                    try:
+                        await response.read()
+                    finally:
+                        response.release()
+            except aiohttp.ClientConnectionError:
+                if connection_retries >= self.CONNECTION_RETRIES:
+                    raise
+                log.exception('Retrying %s %s on connection error', method, url)
+                await asyncio.sleep(2 ** connection_retries)
+                connection_retries += 1
+                continue
+            if response.status not in self.status_forcelist or method not in RETRY_METHODS:
+                return response
+            if retries >= self.max_retries:
+                if self.raise_on_status:
+                    response.raise_for_status()
+                return response
+            retries += 1
+            backoff = self._backoff(retries, response)
+            log.debug('Retrying %s %s [%d] in %.2fs (%d/%d)', method, url, response.status, backoff, retries, self.max_retries)
+            await asyncio.sleep(backoff)
+
+    async def gather_many(
+            self,
+            requests: Iterable[Union[str, dict]],
+            return_exceptions: bool = False
+    ) -> List[Union[aiohttp.ClientResponse, BaseException]]:
+        '''
+        Make many requests concurrently (up to self.concurrency at a time)
+        and return their responses in the same order
+        Arguments:
+            requests:          urls to GET, or dicts of request arguments with optional 'method'
+                               e.g. {'method': 'post', 'url': ..., 'json': {...}}
+            return_exceptions: return exceptions in place of failed requests' responses
+                               instead of raising the first one
+        '''
+        if self.session is None:
+            await self.reset_session()
+        coroutines = []
+        for request in requests:
+            if isinstance(request, str):
+                request = {'url': request}
+            request = dict(request)
+            coroutines.append(self.request(request.pop('method', 'get'), **request))
+        return await asyncio.gather(*coroutines, return_exceptions=return_exceptions)
+
+    async def get(self, *a, **kw):
+        '''Alias for request('get')'''
+        return await self.request('get', *a, **kw)
+
+    async def head(self, *a, **kw):
+        '''Alias for request('head')'''
+        return await self.request('head', *a, **kw)
+
+    async def delete(self, *a, **kw):
+        '''Alias for request('delete')'''
+        return await self.request('delete', *a, **kw)
+
+    async def post(self, *a, **kw):
+        '''Alias for request('post')'''
+        return await self.request('post', *a, **kw)
+
+    async def put(self, *a, **kw):
+        '''Alias for request('put')'''
+        return await self.request('put', *a, **kw)
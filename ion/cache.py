@@ -1,10 +1,12 @@
 '''Functions and classes helping with application-level caching and memoization'''
-from typing import Callable, Any, Optional
+from typing import Callable, Any, Optional, Hashable
 from functools import wraps, partial
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+import threading
 import time
 
 TsValue = namedtuple('TsValue', ['value', 'timestamp'])
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
 
 
 class MemoizeWithTimeout:
@@ -50,6 +52,82 @@ class MemoizeWithTimeout:
         return _wrapper
 
 
+class LRUCache:
+    '''
+    Thread-safe mapping holding at most maxsize entries,
+    which evicts the least recently used entry when it's full
+    Lookups with get or [] are counted as hits or misses
+    Arguments:
+        maxsize: maximum number of entries
+    Usage:
+        >>> cache = LRUCache(2)
+        >>> cache['a'] = 1; cache['b'] = 2; cache.get('a'); cache['c'] = 3
+        1
+        >>> 'b' in cache, cache.info()
+        (False, CacheInfo(hits=1, misses=0, maxsize=2, currsize=2))
+    '''
+    def __init__(self, maxsize: int = 1024):
+        if maxsize < 1:
+            raise ValueError(f'LRUCache maxsize has to be positive, got {maxsize}')
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        '''Get value stored under key (marking it as recently used) or default if there is none'''
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        '''Remove key from the cache, returning its value or default if there is none'''
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def __delitem__(self, key: Hashable) -> None:
+        with self._lock:
+            del self._data[key]
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def clear(self) -> None:
+        '''Remove all entries and reset hit and miss counters'''
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def info(self) -> CacheInfo:
+        '''Get cache statistics'''
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+_MISSING = object()
+
+
 def create_minute_memoize(no_minutes: float):
     '''Creates MemoizeWithTimeout with timeout equal no_minutes minutes'''
     return MemoizeWithTimeout(no_minutes * 60)
@@ -1,5 +1,6 @@
 '''Helper functions and classes for extended use of python3.7's dataclasses'''
-from dataclasses import dataclass, is_dataclass
+from typing import Optional, Type
+from dataclasses import dataclass, is_dataclass, fields
 from functools import wraps
 
 def nested_dataclass(*args, **kwargs):
@@ -38,3 +39,32 @@ def nested_dataclass(*args, **kwargs):
     if args:
         return wrapper(args[0])
     return wrapper
+
+def slotted(cls: Type, name: Optional[str] = None) -> Type:
+    '''
+    Creates a copy of dataclass cls storing its fields in __slots__ instead of
+    a per-instance __dict__ (all base classes have to define __slots__ as well
+    for instances not to have a __dict__ at all)
+    Arguments:
+        cls:  dataclass to be copied
+        name: name of the copy (defaults to cls's name, so that slotted can be used as a decorator)
+    Usage:
+        @slotted
+        @dataclass
+        class A:
+            i: int = 0
+        >>> A().__slots__
+        ('i',)
+    '''
+    if not is_dataclass(cls):
+        raise TypeError(f'{cls!r} is not a dataclass')
+    if '__slots__' in cls.__dict__:
+        raise TypeError(f'{cls.__name__} already defines __slots__')
+    field_names = tuple(_field.name for _field in fields(cls))
+    cls_dict = dict(cls.__dict__)
+    cls_dict['__slots__'] = field_names
+    for attr in (*field_names, '__dict__', '__weakref__'):
+        cls_dict.pop(attr, None)
+    slotted_cls = type(cls)(name or cls.__name__, cls.__bases__, cls_dict)
+    slotted_cls.__qualname__ = name or cls.__qualname__
+    return slotted_cls
@@ -1,8 +1,12 @@
 '''Helper functions and classes for hashing'''
 from functools import partial
-from typing import Any
+from typing import Any, Optional, Iterable, Iterator, Tuple
 import logging
 import hashlib
+import tempfile
+import struct
+import mmap
+import math
 import os
 
 log = logging.getLogger(__name__)
@@ -91,3 +95,293 @@ def hash_dir(dirpath: str, hash_type: str, recursive=True, asbytes=False):
     if asbytes:
         hash_object.digest()
     return hash_object.hexdigest()
+
+
+_MASK64 = (1 << 64) - 1
+
+def fingerprint(string: Any, bits: int = 64) -> int:
+    '''
+    Hash string (or its str representation) into a bits-long integer fingerprint with blake2b
+    Usage:
+        >>> fingerprint('inyourarea.co.uk/news')
+        13067662349332263568
+    '''
+    if not isinstance(string, bytes):
+        string = str(string).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(string, digest_size=bits // 8).digest(), 'little')
+
+
+class FingerprintSet:
+    '''
+    Set of 64- or 128-bit integer fingerprints (e.g. created with ion.hash.fingerprint)
+    stored in an open-addressing hash table of 8-byte words, which takes
+    about 12-24 bytes per 64-bit fingerprint (twice that for 128-bit ones)
+    The table lives either in memory or in a file mapped into memory
+    (so that it persists between runs and the OS pages it in and out as needed)
+    Fingerprints 0 and 1 are treated as the same fingerprint, since 0 marks empty slots
+    Arguments:
+        bits:     bit length of fingerprints (64 or 128)
+        capacity: number of fingerprints the set can hold before it has to grow
+        path:     path of a file storing the set (it's opened if it exists and created otherwise)
+    Usage:
+        >>> with FingerprintSet(path='/tmp/visited.fps') as visited:
+        ...     visited.add(fingerprint('max.com'))
+        True
+        >>> fingerprint('max.com') in FingerprintSet(path='/tmp/visited.fps')
+        True
+    '''
+    MAGIC = b'IONFPS01'
+    MAX_LOAD = 0.7
+    _HEADER = struct.Struct('<8sQQQ') # magic, bits, size, slots number
+    _SIZE = struct.Struct('<Q')
+    _SIZE_OFFSET = 16
+
+    def __init__(self, bits: int = 64, capacity: int = 1 << 16, path: Optional[str] = None):
+        if bits not in (64, 128):
+            raise ValueError(f'FingerprintSet only stores 64 or 128-bit fingerprints, got {bits}')
+        self.bits = bits
+        self.path = path
+        self._words_no = bits // 64
+        self._file = None
+        self._buffer = None
+        self._slots = None
+        self._slots_no = 0
+        self._size = 0
+        if path is not None and os.path.exists(path) and os.path.getsize(path):
+            self._open()
+        else:
+            self._allocate(self._table_size(capacity))
+
+    def _table_size(self, capacity: int) -> int:
+        '''Smallest power of two number of slots holding capacity fingerprints under MAX_LOAD'''
+        return 1 << max(3, math.ceil(math.log2(max(capacity, 1) / self.MAX_LOAD)))
+
+    def _create(self, slots_no: int, path: Optional[str] = None) -> Tuple[Any, Any]:
+        '''Create a zeroed buffer (mapped from a new file at path, if given) for a table of slots_no slots'''
+        nbytes = self._HEADER.size + slots_no * self._words_no * 8
+        if path is None:
+            return None, bytearray(nbytes)
+        file = open(path, 'w+b')
+        file.truncate(nbytes)
+        return file, mmap.mmap(file.fileno(), nbytes)
+
+    def _allocate(self, slots_no: int) -> None:
+        '''Create an empty table of slots_no slots'''
+        self._file, self._buffer = self._create(slots_no, self.path)
+        self._slots_no = slots_no
+        self._view()
+        self._write_header()
+
+    def _open(self) -> None:
+        '''Map an existing set from self.path (the file is left untouched if it's not a valid set)'''
+        with open(self.path, 'rb') as file:
+            header = file.read(self._HEADER.size)
+        if len(header) < self._HEADER.size:
+            raise ValueError(f'{self.path} is not a FingerprintSet file')
+        magic, bits, size, slots_no = self._HEADER.unpack(header)
+        if magic != self.MAGIC:
+            raise ValueError(f'{self.path} is not a FingerprintSet file')
+        if bits != self.bits:
+            raise ValueError(f'{self.path} stores {bits}-bit fingerprints, not {self.bits}-bit ones')
+        self._file = open(self.path, 'r+b')
+        self._buffer = mmap.mmap(self._file.fileno(), 0)
+        self._size, self._slots_no = size, slots_no
+        self._view()
+
+    def _view(self) -> None:
+        self._slots = memoryview(self._buffer)[self._HEADER.size:].cast('Q')
+        self._mask = self._slots_no - 1
+        self._max_size = int(self._slots_no * self.MAX_LOAD)
+
+    def _release(self) -> None:
+        '''Release the table, so that its buffer can be closed or replaced'''
+        if self._slots is not None:
+            self._slots.release()
+            self._slots = None
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        self._buffer = None
+
+    def _write_header(self) -> None:
+        self._HEADER.pack_into(self._buffer, 0, self.MAGIC, self.bits, self._size, self._slots_no)
+
+    def _split(self, _fingerprint: int) -> Tuple[int, int]:
+        '''Split fingerprint into its low and high word'''
+        low = _fingerprint & _MASK64
+        high = (_fingerprint >> 64) & _MASK64 if self._words_no == 2 else 0
+        if not low and not high:
+            low = 1
+        return low, high
+
+    def _locate(self, low: int, high: int) -> Tuple[int, bool]:
+        '''Get position of the fingerprint's slot (or of an empty slot for it) and whether it's there'''
+        slots, mask, words_no = self._slots, self._mask, self._words_no
+        index = low & mask
+        if words_no == 1:
+            while True:
+                slot = slots[index]
+                if slot == low:
+                    return index, True
+                if not slot:
+                    return index, False
+                index = (index + 1) & mask
+        while True:
+            position = index * 2
+            slot_low, slot_high = slots[position], slots[position + 1]
+            if slot_low == low and slot_high == high:
+                return position, True
+            if not slot_low and not slot_high:
+                return position, False
+            index = (index + 1) & mask
+
+    def add(self, _fingerprint: int) -> bool:
+        '''Add fingerprint to the set, returning False if it was there already'''
+        low, high = self._split(_fingerprint)
+        position, found = self._locate(low, high)
+        if found:
+            return False
+        self._slots[position] = low
+        if self._words_no == 2:
+            self._slots[position + 1] = high
+        self._size += 1
+        # keep the size in the header up to date, so that a crashed process leaves a consistent file
+        self._SIZE.pack_into(self._buffer, self._SIZE_OFFSET, self._size)
+        if self._size > self._max_size:
+            self._grow()
+        return True
+
+    def update(self, fingerprints: Iterable[int]) -> None:
+        '''Add all of fingerprints to the set'''
+        for _fingerprint in fingerprints:
+            self.add(_fingerprint)
+
+    def _grow(self) -> None:
+        '''
+        Double the number of slots and re-insert all fingerprints
+        A file-backed set is grown in a temporary file, which then replaces the original one,
+        so that the original file stays intact if the process dies mid-way
+        '''
+        slots_no = self._slots_no * 2
+        log.debug('Growing FingerprintSet with %d fingerprints to %d slots', self._size, slots_no)
+        tmp_path = None
+        if self.path is not None:
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(os.path.abspath(self.path)),
+                prefix=f'.{os.path.basename(self.path)}-',
+                suffix='.tmp'
+            )
+            os.close(fd)
+        try:
+            file, buffer = self._create(slots_no, tmp_path)
+            slots = memoryview(buffer)[self._HEADER.size:].cast('Q')
+            mask, words_no = slots_no - 1, self._words_no
+            for low, high in self._pairs(self._slots):
+                index = low & mask
+                if words_no == 1:
+                    while slots[index]:
+                        index = (index + 1) & mask
+                    slots[index] = low
+                else:
+                    while slots[index * 2] or slots[index * 2 + 1]:
+                        index = (index + 1) & mask
+                    slots[index * 2], slots[index * 2 + 1] = low, high
+            slots.release()
+            self._HEADER.pack_into(buffer, 0, self.MAGIC, self.bits, self._size, slots_no)
+            if file is not None:
+                buffer.flush()
+        except BaseException:
+            if tmp_path is not None:
+                os.unlink(tmp_path)
+            raise
+        self._release()
+        if self._file is not None:
+            self._file.close()
+            os.replace(tmp_path, self.path)
+        self._file, self._buffer = file, buffer
+        self._slots_no = slots_no
+        self._view()
+
+    def _pairs(self, slots) -> Iterator[Tuple[int, int]]:
+        '''Iterate over (low, high) words of fingerprints stored in slots'''
+        if self._words_no == 1:
+            return ((low, 0) for low in slots if low)
+        return (
+            (low, high)
+            for low, high in zip(slots[::2], slots[1::2])
+            if low or high
+        )
+
+    def __contains__(self, _fingerprint: int) -> bool:
+        return self._locate(*self._split(_fingerprint))[1]
+
+    def __iter__(self) -> Iterator[int]:
+        return (high << 64 | low for low, high in self._pairs(self._slots))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def flush(self) -> None:
+        '''Write the set to its file (if it has one)'''
+        if self._buffer is not None:
+            self._write_header()
+            if isinstance(self._buffer, mmap.mmap):
+                self._buffer.flush()
+
+    def close(self) -> None:
+        '''Flush and close the set's file (if it has one)'''
+        self.flush()
+        self._release()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class BloomFilter:
+    '''
+    Bloom filter of integer fingerprints (e.g. created with ion.hash.fingerprint)
+    Answers whether a fingerprint was added with no false negatives and
+    about error_rate false positives, as long as it holds no more than capacity fingerprints
+    Arguments:
+        capacity:   expected number of fingerprints
+        error_rate: false positive rate at capacity
+    Usage:
+        >>> bloom = BloomFilter(1000)
+        >>> bloom.add(fingerprint('max.com'))
+        >>> fingerprint('max.com') in bloom, fingerprint('min.com') in bloom
+        (True, False)
+    '''
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        if not 0 < error_rate < 1:
+            raise ValueError(f'Bloom filter error rate has to be between 0 and 1, got {error_rate}')
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bits_no = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes_no = max(1, round(self.bits_no / capacity * math.log(2)))
+        self._bits = bytearray((self.bits_no + 7) // 8)
+
+    def add(self, _fingerprint: int) -> None:
+        '''Add fingerprint to the filter'''
+        # Bit positions are derived from the two halves of the fingerprint (double hashing)
+        position, step = _fingerprint & 0xffffffff, (_fingerprint >> 32 & 0xffffffff) | 1
+        bits, bits_no = self._bits, self.bits_no
+        for _ in range(self.hashes_no):
+            position %= bits_no
+            bits[position >> 3] |= 1 << (position & 7)
+            position += step
+
+    def __contains__(self, _fingerprint: int) -> bool:
+        position, step = _fingerprint & 0xffffffff, (_fingerprint >> 32 & 0xffffffff) | 1
+        bits, bits_no = self._bits, self.bits_no
+        for _ in range(self.hashes_no):
+            position %= bits_no
+            if not bits[position >> 3] & 1 << (position & 7):
+                return False
+            position += step
+        return True
@@ -1,15 +1,30 @@
 '''InYourArea ItemStore helper functions and classes'''
-from typing import Dict, Optional, Any
+from typing import Dict, Optional, Any, Iterator, Iterable, List, Tuple, Callable, Awaitable, ClassVar
 from dataclasses import dataclass, field
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial, wraps
+import threading
+import tempfile
+import asyncio
+import inspect
 import logging
+import queue
 import time
+import os
+import re
+
+import simplejson as json
 
 from .requests import Requests
-from .url import parse, domain
+from .url import ParsedUrl, parse, domain, query_to_dict
 from ._class import DCDict
-from .time import msts
+from .dataclasses import slotted
+from .time import msts, pts
 from .time.period import Period
 from .hash import md5
+from .json import read_json, iter_array
 
 log = logging.getLogger(__name__)
 # id and iid scheme constants
@@ -17,11 +32,76 @@ log = logging.getLogger(__name__)
 ID_LEN = 36
 ID_CHUNKS_NO = 5
 ID_CHUNK_LENS = [8, 4, 4, 4, 12]
+ID_DASHES = [8, 13, 18, 23]
+_ID_PATTERN = re.compile(r'[^-]{8}-[^-]{4}-[^-]{4}-[^-]{4}-[^-]{12}')
+_ID_CHUNK = '[0-9A-Za-z]'
+_ID_SCAN_REGEX = (
+    rf'(?<![0-9A-Za-z-]){_ID_CHUNK}{{8}}-{_ID_CHUNK}{{4}}-{_ID_CHUNK}{{4}}-'
+    rf'{_ID_CHUNK}{{4}}-{_ID_CHUNK}{{12}}(?![0-9A-Za-z-])'
+)
+_ID_SCAN_PATTERNS = {
+    str: re.compile(_ID_SCAN_REGEX),
+    bytes: re.compile(_ID_SCAN_REGEX.encode('ascii'))
+}
+
+
+_bulk = threading.local()
+
+
+@contextmanager
+def _bulk_memo():
+    '''Within this context functions decorated with _bulk_memoized memoize their results in the current thread'''
+    if getattr(_bulk, 'memo', None) is not None:
+        yield
+        return
+    _bulk.memo = {}
+    try:
+        yield
+    finally:
+        _bulk.memo = None
+
+def _bulk_memoized(func: Callable) -> Callable:
+    '''Memoize func's results per distinct arguments, but only within _bulk_memo context'''
+    @wraps(func)
+    def _wrapper(*a):
+        memo = getattr(_bulk, 'memo', None)
+        if memo is None:
+            return func(*a)
+        key = (func, *a)
+        try:
+            return memo[key]
+        except KeyError:
+            value = memo[key] = func(*a)
+            return value
+    return _wrapper
+
+_memo_md5 = _bulk_memoized(md5)
+_memo_domain = _bulk_memoized(domain)
+
+@_bulk_memoized
+def _section_url(url: str) -> str:
+    '''Normalise section url to domain, path and query'''
+    parsed = ParsedUrl(url)
+    return domain(parsed, level=None) + parse(parsed, 'path query')
+
+
+class ItemStoreModel(DCDict):
+    '''Base class of ItemStore dataclasses'''
+    __slots__ = ()
+
+    @classmethod
+    def from_dicts(cls, dicts: Iterable[dict]) -> list:
+        '''
+        Construct instances from an iterable of dicts,
+        normalising and hashing every distinct url only once
+        '''
+        with _bulk_memo():
+            return [cls(**dct) for dct in dicts]
 
 
 # TODO: List attributes
 @dataclass
-class Publisher(DCDict):
+class Publisher(ItemStoreModel):
     '''
     ItemStore Publisher representing Harvester Publisher
     Attributes:
@@ -33,18 +113,20 @@ class Publisher(DCDict):
 
     def __post_init__(self):
         if self.uuid is None:
-            self.uuid = md5(self.name)
+            self.uuid = _memo_md5(self.name)
 
 
 @dataclass
-class SimplifiedPublication(DCDict):
+class SimplifiedPublication(ItemStoreModel):
     '''ItemStore Simplified Publication representing Harvester Publication'''
     url: str
     publisher: Optional[str] = None
     mode: Optional[str] = 'smart'
+    publication_class: ClassVar[type]
+
     def expand(self):
         '''Convert simplified publication into a fill publication'''
-        _domain = domain(self.url)
+        _domain = _memo_domain(self.url)
         section: Dict[str, Any] = {
             'url': self.url,
             'job': {
@@ -52,7 +134,7 @@ class SimplifiedPublication(DCDict):
                 'entrypoint': self.url
             }
         }
-        return Publication(**{
+        return self.publication_class(**{
             'name': _domain,
             'domain': _domain,
             'publisher': self.publisher,
@@ -63,7 +145,7 @@ class SimplifiedPublication(DCDict):
 
 
 @dataclass
-class Publication(DCDict):
+class Publication(ItemStoreModel):
     '''ItemStore Publication representing Harvester Publication'''
     name: str
     domain: str
@@ -75,16 +157,17 @@ class Publication(DCDict):
     parent_type: Optional[str] = None
     iid: Optional[str] = None
     settings: dict = field(default_factory=dict)
+    section_class: ClassVar[type]
 
     def __post_init__(self):
-        self.domain = domain(self.domain)
-        self.sections = [Section(**section) for section in self.sections]
-        self.uuid = md5(self.domain)
+        self.domain = _memo_domain(self.domain)
+        self.sections = [self.section_class(**section) for section in self.sections]
+        self.uuid = _memo_md5(self.domain)
 
 
 # TODO: Consider removing settings from Section dataclass
 @dataclass
-class Section(DCDict):
+class Section(ItemStoreModel):
     '''
     ItemStore Section representing Publication's section
     Attributes:
@@ -101,9 +184,22 @@ class Section(DCDict):
     uuid: Optional[str] = None
 
     def __post_init__(self):
-        self.url = domain(self.url, level=None) + parse(self.url, 'path query')
+        self.url = _section_url(self.url)
         if self.uuid is None:
-            self.uuid = md5(self.url)
+            self.uuid = _memo_md5(self.url)
+
+
+Publication.section_class = Section
+SimplifiedPublication.publication_class = Publication
+
+# Variants of ItemStore models storing their fields in __slots__,
+# which saves memory when hundreds of thousands of them are loaded
+CompactPublisher = slotted(Publisher, 'CompactPublisher')
+CompactSection = slotted(Section, 'CompactSection')
+CompactPublication = slotted(Publication, 'CompactPublication')
+CompactPublication.section_class = CompactSection
+CompactSimplifiedPublication = slotted(SimplifiedPublication, 'CompactSimplifiedPublication')
+CompactSimplifiedPublication.publication_class = CompactPublication
 
 
 def is_valid_id(_id: str) -> bool:
@@ -119,21 +215,139 @@ def is_valid_id(_id: str) -> bool:
         return False
     return True
 
-# TODO: Enable new Paginator flow
-# Paginator()
-#     .get('articles')
-#     .params(
-#         after=0
-#         before=now()
-#     )
-#     .limit(100)
-#     .map(
-#         lambda item: item
-#     )
-#     .end()
-class Paginator(object):
+def are_valid_ids(ids):
+    '''
+    Checks whether each of itemstore ids or iids is valid (look: is_valid_id) in one pass
+    Like in is_valid_id, only str ids can be valid, so bytes ids (and arrays of them) are not
+    Arguments:
+        ids: sequence of ids, or a NumPy array of them
+    Returns:
+        list of bools aligned with ids, or a NumPy bool array if ids is a NumPy array
+    Usage:
+        >>> are_valid_ids(['76b79801-8d3e-4158-a280-afb2e505adf0', '76b79801', None])
+        [True, False, False]
+    '''
+    if hasattr(ids, 'dtype'):
+        return _are_valid_ids_array(ids)
+    fullmatch = _ID_PATTERN.fullmatch
+    return [isinstance(_id, str) and fullmatch(_id) is not None for _id in ids]
+
+def _are_valid_ids_array(ids):
+    '''Vectorized are_valid_ids for NumPy arrays of fixed-width str (other dtypes are checked per item)'''
+    import numpy as np # pylint: disable=import-outside-toplevel
+    ids = np.asarray(ids)
+    if ids.dtype.kind == 'S':
+        return np.zeros(ids.shape, dtype=bool)
+    if ids.dtype.kind != 'U':
+        return np.fromiter(are_valid_ids(ids.ravel().tolist()), dtype=bool, count=ids.size).reshape(ids.shape)
+    # Look at fixed-width strings as rows of code points, where shorter strings are padded with zeros
+    width = ids.dtype.itemsize // 4
+    if width < ID_LEN or ids.size == 0:
+        return np.zeros(ids.shape, dtype=bool)
+    chars = np.ascontiguousarray(ids).reshape(-1).view(np.uint32).reshape(-1, width)
+    dashes = np.zeros(ID_LEN, dtype=bool)
+    dashes[ID_DASHES] = True
+    valid = (chars[:, ID_LEN - 1] != 0) & ((chars[:, :ID_LEN] == ord('-')) == dashes).all(axis=1)
+    if width > ID_LEN:
+        valid &= (chars[:, ID_LEN:] == 0).all(axis=1)
+    return valid.reshape(ids.shape)
+
+def find_ids(buffer):
+    '''
+    Extracts all itemstore ids or iids (with alphanumeric chunks) from a large text
+    Arguments:
+        buffer: str, or bytes-like object e.g. bytes or mmap (ids are returned as bytes then)
+    Usage:
+        >>> find_ids('GET /articles/76b79801-8d3e-4158-a280-afb2e505adf0 200')
+        ['76b79801-8d3e-4158-a280-afb2e505adf0']
+    '''
+    pattern = _ID_SCAN_PATTERNS[str if isinstance(buffer, str) else bytes]
+    return pattern.findall(buffer)
+
+@dataclass
+class PageSummary:
+    '''Summary of a page needed to move the pagination cursor past it'''
+    size: int = 0
+    fresh: int = 0
+    earliest: Optional[int] = None
+    latest: Optional[int] = None
+
+    def add(self, timestamp: int, fresh: bool) -> None:
+        '''Record an item with lastModifiedTime timestamp'''
+        self.size += 1
+        self.fresh += fresh
+        if self.earliest is None or timestamp < self.earliest:
+            self.earliest = timestamp
+        if self.latest is None or timestamp > self.latest:
+            self.latest = timestamp
+
+
+class SeenIids:
+    '''
+    Iids of already returned items which may still be returned by the following pages,
+    grouped by their lastModifiedTime
+    Pages are requested backwards in time, so once the pagination cursor (`before`) moves
+    past a timestamp, iids with that timestamp can be forgotten, which keeps the structure
+    bounded by the number of items sharing the cursor's timestamp
+    '''
+    def __init__(self):
+        self._iids = set()
+        self._by_timestamp = {}
+
+    def __contains__(self, iid: str) -> bool:
+        return iid in self._iids
+
+    def __len__(self) -> int:
+        return len(self._iids)
+
+    def add(self, iid: str, timestamp: int) -> None:
+        '''Remember that an item with iid and lastModifiedTime timestamp was returned'''
+        self._iids.add(iid)
+        self._by_timestamp.setdefault(timestamp, set()).add(iid)
+
+    def forget_after(self, timestamp: int) -> None:
+        '''Forget iids with lastModifiedTime greater than timestamp'''
+        for newer in [newer for newer in self._by_timestamp if newer > timestamp]:
+            self._iids.difference_update(self._by_timestamp.pop(newer))
+
+    def to_list(self) -> List[Tuple[str, int]]:
+        '''Serializable representation of self'''
+        return [
+            (iid, timestamp)
+            for timestamp, iids in self._by_timestamp.items()
+            for iid in iids
+        ]
+
+    @classmethod
+    def from_list(cls, seen) -> 'SeenIids':
+        '''Recreate SeenIids from its to_list() representation'''
+        instance = cls()
+        for iid, timestamp in seen:
+            instance.add(iid, timestamp)
+        return instance
+
+class BasePaginator(object):
+    '''
+    Cursor logic shared by Paginator and AsyncPaginator
+    Walks an ItemStore collection backwards in time from `before` to `after`,
+    one page of `count` items at a time
+    Arguments:
+        url:         ItemStore endpoint url (its query is merged into request params)
+    Keyword arguments:
+        total_count: stop after this many items have been returned
+        batch_size:  default number of items requested per page
+        period:      how far back to paginate e.g. '30d' (alternative to `after`)
+        max_retries: how many times should a failed page request be retried
+        target_latency: if set, batch size is adapted to recent responses so that
+                        a page request takes about this many seconds
+        target_bytes:   if set, batch size is adapted to recent responses so that
+                        a page response has about this many bytes
+        **kwargs:    additional request params
+    '''
     MAX_BATCH_SIZE = 3000
+    MIN_BATCH_SIZE = 10
     DEFAULT_BATCH_SIZE = 500
+    ADAPTIVE_SAMPLES = 5
 
     def __init__(
             self,
@@ -142,32 +356,35 @@ class Paginator(object):
             batch_size: int = DEFAULT_BATCH_SIZE,
             period: Optional[str] = None,
             max_retries: int = 5,
+            target_latency: Optional[float] = None,
+            target_bytes: Optional[int] = None,
             **kwargs
     ):
-        requests = Requests()
-        self.REQUEST_TYPES = {
-            'GET': requests.get
-        }
         self.requested_count = total_count
         self.batch_size = batch_size
         self.max_retries = max_retries
+        self.target_latency = target_latency
+        self.target_bytes = target_bytes
+        self._samples = deque(maxlen=self.ADAPTIVE_SAMPLES)
         self._request_type = 'GET'
-        self.req = self.REQUEST_TYPES[self._request_type]
-        self.url = parse(url, ['scheme', 'host', 'path'])
+        parsed = ParsedUrl(url)
+        self.url = parse(parsed, ['scheme', 'host', 'path'])
         self.last_batch = None
         self._batch = None
+        self._clean_batch = None
+        self.summary = PageSummary()
+        self.seen = SeenIids()
         self.returned = 0
         self.history = []
-        params = parse(url, ['query'], as_dict=True)['query']
-        params = dict(params or {}, **kwargs)
-        self.params = params
+        self.params = dict(query_to_dict(parsed), **kwargs)
         if period:
             if self.before or self.after:
                 raise ValueError(f'period argument overrides other defined before or after')
             self.after = Period(period).to_timestamp(ms=True)
         self._init_params()
         log.info(
-            "Initializing Paginator [%s] for '%s' with params: %r]",
+            "Initializing %s [%s] for '%s' with params: %r]",
+            type(self).__name__,
             self._request_type,
             self.url,
             self.params
@@ -213,20 +430,29 @@ class Paginator(object):
     def batch(self, value):
         self.last_batch = self._batch
         self._batch = value
+        self.summary = PageSummary()
+        self._clean_batch = [item for item in value or () if self._accept(item)]
+
+    def _accept(self, item: dict) -> bool:
+        '''Record an item of the current page and check whether it has not been returned before'''
+        iid, timestamp = item['iid'], item['lastModifiedTime']
+        fresh = iid not in self.seen
+        if fresh:
+            self.seen.add(iid, timestamp)
+        self.summary.add(timestamp, fresh)
+        return fresh
 
     @property
     def clean_batch(self):
-        if self.last_batch is None:
-            return self.batch
-        iids = set(item['iid'] for item in self.last_batch)
-        return [item for item in self.batch if item['iid'] not in iids]
+        '''Items of the current batch that have not been returned with any of the previous batches'''
+        return self._clean_batch
 
     def update_params(self):
         self.history.append(self.before)
-        earliest_timestamp = min(item['lastModifiedTime'] for item in self.batch)
-        latest_timestamp = max(item['lastModifiedTime'] for item in self.batch)
+        earliest_timestamp = self.summary.earliest
+        latest_timestamp = self.summary.latest
         if earliest_timestamp == latest_timestamp:
-            if self.clean_batch:
+            if self.summary.fresh:
                 if self.count != self.MAX_BATCH_SIZE:
                     new_count = min(self.count * 2, self.MAX_BATCH_SIZE)
                     log.info(
@@ -240,7 +466,7 @@ class Paginator(object):
                     log.warning(
                         ('Encountered a page filled with %s items with the same timestamp %s!!! '
                          'Some items are going to be ignored...'),
-                        len(self.batch),
+                        self.summary.size,
                         earliest_timestamp
                     )
                     self.before = earliest_timestamp - 1
@@ -250,22 +476,54 @@ class Paginator(object):
         else:
             self.before = earliest_timestamp
             self.count = self.batch_size
+        self.seen.forget_after(self.before)
 
-    def issue_request(self):
-        retries = 0
-        while retries <= self.max_retries:
-            response = self.req(self.url, params=self.params)
-            if response.ok:
-                return response.json()
-            log.warning(
-                'Retrying request %s to %s with params %s [%s]',
-                self._request_type,
-                self.url,
-                self.params,
-                response
-            )
-            time.sleep(2 ** retries)
-            retries += 1
+    @property
+    def adaptive(self) -> bool:
+        '''Is batch size adapted to the observed latency or payload size?'''
+        return self.target_latency is not None or self.target_bytes is not None
+
+    def _adapt_batch_size(self, elapsed: float, ok: bool, items_no: int = 0, size: Optional[int] = None) -> None:
+        '''
+        Record a response and scale batch size towards target latency/bytes
+        assuming both grow linearly with the number of items in a page
+        The batch size is at most doubled or halved at a time,
+        and is halved when a request fails
+        '''
+        if not self.adaptive:
+            return
+        if not ok:
+            new_size = self.batch_size // 2
+            self.count = max(self.count // 2, self.MIN_BATCH_SIZE)
+        else:
+            if not items_no:
+                return
+            self._samples.append((items_no, elapsed, size))
+            items_no = sum(sample[0] for sample in self._samples)
+            scales = []
+            if self.target_latency is not None:
+                scales.append(self.target_latency * items_no / sum(sample[1] for sample in self._samples))
+            sizes = [sample[2] for sample in self._samples if sample[2] is not None]
+            if self.target_bytes is not None and len(sizes) == len(self._samples):
+                scales.append(self.target_bytes * items_no / sum(sizes))
+            if not scales:
+                return
+            new_size = int(min(scales))
+        new_size = min(max(new_size, self.batch_size // 2, self.MIN_BATCH_SIZE), self.batch_size * 2, self.MAX_BATCH_SIZE)
+        if new_size != self.batch_size:
+            log.debug('Adapting batch size from %s to %s', self.batch_size, new_size)
+            self.batch_size = new_size
+
+    def _log_retry(self, response):
+        log.warning(
+            'Retrying request %s to %s with params %s [%s]',
+            self._request_type,
+            self.url,
+            self.params,
+            response
+        )
+
+    def _log_too_many_retries(self, retries, response):
         log.error(
             'Too many retries %s for %s to %s with params %s [%s]',
             retries,
@@ -274,26 +532,615 @@ class Paginator(object):
             self.params,
             response
         )
+
+
+class Paginator(BasePaginator):
+    '''
+    Iterates over items of an ItemStore collection walking backwards in time
+    from `before` to `after`, one page of `count` items at a time
+    Keyword arguments:
+        prefetch:    how many pages should be fetched in a background thread ahead
+                     of the consumer (0 disables prefetching)
+        requests:    Requests instance to issue requests with (e.g. a shared session)
+        checkpoint:  path of a local file in which cursor state (params, history, returned
+                     count and iids which may still be returned again) is persisted, so that
+                     a restarted Paginator resumes where the last one has stopped
+        checkpoint_every: how many consumed pages there are between checkpoints
+        stream:      decode pages incrementally from the response stream, handing out
+                     their items in chunks of STREAM_CHUNK_SIZE as soon as they are decoded
+                     (batch, last_batch and clean_batch are not kept in this mode)
+        look: BasePaginator
+    '''
+    STREAM_CHUNK_SIZE = 100
+    STREAM_READ_SIZE = 65536
+
+    def __init__(
+            self,
+            url,
+            total_count: Optional[int] = None,
+            batch_size: int = BasePaginator.DEFAULT_BATCH_SIZE,
+            period: Optional[str] = None,
+            max_retries: int = 5,
+            prefetch: int = 0,
+            requests: Optional[Requests] = None,
+            checkpoint: Optional[str] = None,
+            checkpoint_every: int = 1,
+            stream: bool = False,
+            **kwargs
+    ):
+        if requests is None:
+            requests = Requests()
+        self.REQUEST_TYPES = {
+            'GET': requests.get
+        }
+        self.prefetch = prefetch
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        self.stream = stream
+        super().__init__(
+            url,
+            total_count=total_count,
+            batch_size=batch_size,
+            period=period,
+            max_retries=max_retries,
+            **kwargs
+        )
+        self.req = self.REQUEST_TYPES[self._request_type]
+        if checkpoint is not None and os.path.exists(checkpoint):
+            self.restore_checkpoint()
+
+    def _state(self) -> dict:
+        '''Snapshot of the cursor state needed to resume pagination after the current page'''
+        return {
+            'url': self.url,
+            'params': dict(self.params),
+            'history': list(self.history),
+            'seen': self.seen.to_list()
+        }
+
+    def save_checkpoint(self, state: dict) -> None:
+        '''Atomically replace the checkpoint file with state'''
+        dirname = os.path.dirname(os.path.abspath(self.checkpoint))
+        fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix='.paginator-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as file:
+                json.dump(state, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.checkpoint)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def restore_checkpoint(self) -> None:
+        '''Resume cursor state from the checkpoint file'''
+        state = read_json(self.checkpoint)
+        if state['url'] != self.url:
+            raise ValueError(f"Checkpoint {self.checkpoint} was saved for '{state['url']}' not '{self.url}'")
+        self.params = state['params']
+        self.history = state['history']
+        self.returned = state['returned']
+        self.seen = SeenIids.from_list(state['seen'])
+        log.info(
+            'Resuming Paginator from checkpoint %s with params: %r (%s items already returned)',
+            self.checkpoint,
+            self.params,
+            self.returned
+        )
+
+    def issue_request(self):
+        retries = 0
+        while retries <= self.max_retries:
+            start = pts()
+            if self.stream:
+                response = self.req(self.url, params=self.params, stream=True)
+            else:
+                response = self.req(self.url, params=self.params)
+            if response.ok:
+                if self.stream:
+                    return self._stream_items(response, start)
+                items = response.json()
+                self._adapt_batch_size(pts() - start, True, len(items or ()), response_size(response))
+                return items
+            self._adapt_batch_size(pts() - start, False)
+            self._log_retry(response)
+            if self.stream:
+                response.close()
+            time.sleep(2 ** retries)
+            retries += 1
+        self._log_too_many_retries(retries, response)
         raise StopIteration
 
-    def __iter__(self):
+    def _stream_items(self, response, start: float) -> Iterator[dict]:
+        '''
+        Decode items from a streamed response as they arrive
+        Latency passed to _adapt_batch_size only counts time spent waiting for the response,
+        and not time the consumer spends processing items in between chunks
+        '''
+        size = items_no = 0
+        elapsed = pts() - start
+
+        def chunks():
+            nonlocal size, elapsed
+            content = response.iter_content(chunk_size=self.STREAM_READ_SIZE)
+            while True:
+                read_start = pts()
+                chunk = next(content, None)
+                elapsed += pts() - read_start
+                if chunk is None:
+                    return
+                size += len(chunk)
+                yield chunk
+
+        try:
+            for item in iter_array(chunks()):
+                items_no += 1
+                yield item
+        finally:
+            response.close()
+        self._adapt_batch_size(elapsed, True, items_no, size)
+
+    def _pages(self) -> Iterator[Tuple[List[dict], Optional[dict]]]:
+        '''
+        Issue consecutive page requests and yield their de-duplicated items
+        together with the cursor state after each page
+        In stream mode a page is yielded in chunks, and all but its last chunk come with no state
+        Cursor params are updated before a page is yielded, so that the next
+        request does not depend on the page being consumed
+        '''
         try:
             while self.after <= self.before:
-                self.batch = self.issue_request()
-                if self.batch:
-                    for item in self.clean_batch:
-                        yield item
-                        self.returned += 1
-                        if self.requested_count is not None and self.returned >= self.requested_count:
-                            log.info(
-                                'Requested count %s met - stopping...',
-                                self.requested_count
-                            )
-                            raise StopIteration
-                    self.update_params()
+                if self.stream:
+                    self.summary = PageSummary()
+                    page = []
+                    for item in self.issue_request():
+                        if self._accept(item):
+                            page.append(item)
+                            if len(page) == self.STREAM_CHUNK_SIZE:
+                                yield page, None
+                                page = []
+                    empty = not self.summary.size
                 else:
+                    self.batch = self.issue_request()
+                    page = self.clean_batch
+                    empty = not self.batch
+                if empty:
                     log.info('Received empty batch - stopping...')
-                    raise StopIteration
+                    return
+                self.update_params()
+                yield page, self._state()
             log.info('Reached end of specified period: %s', self.after)
         except StopIteration:
             return
+
+    def _prefetched_pages(self) -> Iterator[Tuple[List[dict], Optional[dict]]]:
+        '''
+        Run self._pages in a background thread, keeping at most self.prefetch pages
+        fetched ahead of the consumer
+        '''
+        pages: queue.Queue = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+
+        def produce():
+            try:
+                for page in self._pages():
+                    if not _put_until_stopped(pages, page, stop):
+                        return
+            except Exception as ex: # pylint: disable=broad-except
+                _put_until_stopped(pages, _WorkerError(ex), stop)
+            finally:
+                _put_until_stopped(pages, _END_OF_PAGES, stop)
+
+        producer = threading.Thread(target=produce, name=f'Paginator-prefetch-{id(self):x}', daemon=True)
+        producer.start()
+        try:
+            while True:
+                page = pages.get()
+                if page is _END_OF_PAGES:
+                    return
+                if isinstance(page, _WorkerError):
+                    raise page.error
+                yield page
+        finally:
+            stop.set()
+
+    def pages(self) -> Iterator[List[dict]]:
+        '''
+        Yield consecutive pages of de-duplicated items
+        A page counts as returned (and is checkpointed) once the next one is requested
+        '''
+        if _count_met(self):
+            return
+        pages = self._prefetched_pages() if self.prefetch else self._pages()
+        page_no = 0
+        try:
+            for page, state in pages:
+                if self.requested_count is not None:
+                    page = page[:self.requested_count - self.returned]
+                yield page
+                self.returned += len(page)
+                if _count_met(self):
+                    return
+                if state is None:
+                    continue
+                page_no += 1
+                if self.checkpoint is not None and page_no % self.checkpoint_every == 0:
+                    self.save_checkpoint(dict(state, returned=self.returned))
+            if self.checkpoint is not None and os.path.exists(self.checkpoint):
+                log.info('Pagination finished - removing checkpoint %s', self.checkpoint)
+                os.remove(self.checkpoint)
+        finally:
+            pages.close()
+
+    def flow(self) -> 'Flow':
+        '''Start a lazy map/filter/batch/limit pipeline over pages of this Paginator'''
+        return Flow(self.pages)
+
+    def __iter__(self):
+        for page in self.pages():
+            yield from page
+
+
+class AsyncPaginator(BasePaginator):
+    '''
+    asyncio counterpart of Paginator, to be iterated with `async for`
+    Keyword arguments:
+        transport: coroutine function called as `await transport(url, params=params)`
+                   returning a response with `ok` attribute and `json()` method
+                   (json() may return an awaitable e.g. for aiohttp responses)
+                   Defaults to Requests.get run in the event loop's default executor
+        look: BasePaginator
+    '''
+    def __init__(
+            self,
+            url,
+            total_count: Optional[int] = None,
+            batch_size: int = BasePaginator.DEFAULT_BATCH_SIZE,
+            period: Optional[str] = None,
+            max_retries: int = 5,
+            transport: Optional[Callable[..., Awaitable]] = None,
+            **kwargs
+    ):
+        if transport is None:
+            transport = executor_transport(Requests())
+        self.transport = transport
+        super().__init__(
+            url,
+            total_count=total_count,
+            batch_size=batch_size,
+            period=period,
+            max_retries=max_retries,
+            **kwargs
+        )
+
+    async def issue_request(self):
+        retries = 0
+        while retries <= self.max_retries:
+            start = pts()
+            response = await self.transport(self.url, params=dict(self.params))
+            if response.ok:
+                items = response.json()
+                if inspect.isawaitable(items):
+                    items = await items
+                self._adapt_batch_size(pts() - start, True, len(items or ()), response_size(response))
+                return items
+            self._adapt_batch_size(pts() - start, False)
+            self._log_retry(response)
+            await asyncio.sleep(2 ** retries)
+            retries += 1
+        self._log_too_many_retries(retries, response)
+        raise StopAsyncIteration
+
+    async def __aiter__(self):
+        try:
+            while self.after <= self.before:
+                self.batch = await self.issue_request()
+                if not self.batch:
+                    log.info('Received empty batch - stopping...')
+                    return
+                page = self.clean_batch
+                self.update_params()
+                for item in page:
+                    yield item
+                    self.returned += 1
+                    if self.requested_count is not None and self.returned >= self.requested_count:
+                        log.info(
+                            'Requested count %s met - stopping...',
+                            self.requested_count
+                        )
+                        return
+            log.info('Reached end of specified period: %s', self.after)
+        except (StopIteration, StopAsyncIteration):
+            return
+
+
+def response_size(response) -> Optional[int]:
+    '''Get response payload size in bytes from its body if it was read or Content-Length header'''
+    content = getattr(response, 'content', None)
+    if isinstance(content, (bytes, bytearray)):
+        return len(content)
+    content_length = (getattr(response, 'headers', None) or {}).get('Content-Length')
+    if content_length is not None:
+        return int(content_length)
+    return None
+
+
+def executor_transport(requests: Requests) -> Callable[..., Awaitable]:
+    '''Wrap synchronous Requests.get into a coroutine function running it in the default executor'''
+    async def transport(url, params=None):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, partial(requests.get, url, params=params))
+    return transport
+
+
+class ShardedPaginator:
+    '''
+    Splits `after`..`before` range into disjoint time shards and paginates them
+    concurrently over a shared Requests session, merging their items into a single
+    de-duplicated stream
+    Arguments:
+        url:         ItemStore endpoint url
+    Keyword arguments:
+        shards:      number of time shards the range is split into
+        workers:     how many shards are paginated concurrently (defaults to shards)
+        ordered:     yield items shard by shard, newest first, so that the stream is ordered
+                     by lastModifiedTime (otherwise pages are yielded as soon as they arrive)
+        buffer:      how many pages can be held in memory per shard if ordered, or in total if not
+        total_count: stop after this many items have been returned
+        period:      how far back to paginate e.g. '30d' (alternative to `after`)
+        **kwargs:    look at Paginator, except for checkpoint, checkpoint_every and prefetch,
+                     which shards don't support
+    '''
+    UNSUPPORTED_ARGUMENTS = ('checkpoint', 'checkpoint_every', 'prefetch')
+    def __init__(
+            self,
+            url,
+            shards: int = 4,
+            workers: Optional[int] = None,
+            ordered: bool = False,
+            buffer: int = 4,
+            total_count: Optional[int] = None,
+            period: Optional[str] = None,
+            requests: Optional[Requests] = None,
+            **kwargs
+    ):
+        if shards < 1:
+            raise ValueError(f'Number of shards must be positive, got {shards}')
+        unsupported = [argument for argument in self.UNSUPPORTED_ARGUMENTS if argument in kwargs]
+        if unsupported:
+            raise ValueError(f"ShardedPaginator doesn't support {', '.join(unsupported)} argument(s)")
+        self.requested_count = total_count
+        self.workers = min(workers or shards, shards)
+        self.ordered = ordered
+        self.buffer = buffer
+        self.returned = 0
+        params = dict(query_to_dict(ParsedUrl(url)), **kwargs)
+        after, before = params.pop('after', None), params.pop('before', None)
+        if period:
+            if before or after:
+                raise ValueError(f'period argument overrides other defined before or after')
+            after = Period(period).to_timestamp(ms=True)
+        if after is None:
+            after = 0
+        if before is None:
+            before = msts() + 1
+        self.after = int(after)
+        self.before = int(before)
+        self.requests = requests or Requests()
+        self.boundaries = set()
+        self.paginators = []
+        for shard_after, shard_before in split_range(self.after, self.before, shards):
+            self.boundaries.update((shard_after, shard_before))
+            self.paginators.append(Paginator(
+                url,
+                requests=self.requests,
+                after=shard_after,
+                before=shard_before,
+                **params
+            ))
+
+    def _pages(self) -> Iterator[List[dict]]:
+        '''Paginate shards in worker threads and yield their pages'''
+        stop = threading.Event()
+        if self.ordered:
+            outputs = [queue.Queue(maxsize=self.buffer) for _ in self.paginators]
+        else:
+            outputs = [queue.Queue(maxsize=self.buffer)] * len(self.paginators)
+        todo: queue.Queue = queue.Queue()
+        for index in range(len(self.paginators)):
+            todo.put(index)
+
+        def work():
+            while not stop.is_set():
+                try:
+                    index = todo.get_nowait()
+                except queue.Empty:
+                    return
+                output = outputs[index]
+                try:
+                    for page, _ in self.paginators[index]._pages(): # pylint: disable=protected-access
+                        if not _put_until_stopped(output, page, stop):
+                            return
+                except Exception as ex: # pylint: disable=broad-except
+                    _put_until_stopped(output, _WorkerError(ex), stop)
+                finally:
+                    _put_until_stopped(output, _END_OF_PAGES, stop)
+
+        for worker_no in range(self.workers):
+            threading.Thread(target=work, name=f'ShardedPaginator-{id(self):x}-{worker_no}', daemon=True).start()
+        try:
+            for output in (outputs if self.ordered else outputs[:1]):
+                shards_left = 1 if self.ordered else len(self.paginators)
+                while shards_left:
+                    page = output.get()
+                    if page is _END_OF_PAGES:
+                        shards_left -= 1
+                    elif isinstance(page, _WorkerError):
+                        raise page.error
+                    else:
+                        yield page
+        finally:
+            stop.set()
+
+    def pages(self) -> Iterator[List[dict]]:
+        '''Yield pages of de-duplicated items from all shards'''
+        # Adjacent shards share a boundary timestamp, so only items
+        # sitting on a boundary can be returned by more than one shard
+        boundary_iids = set()
+
+        def is_new(item: dict) -> bool:
+            if item['lastModifiedTime'] not in self.boundaries:
+                return True
+            if item['iid'] in boundary_iids:
+                return False
+            boundary_iids.add(item['iid'])
+            return True
+
+        if _count_met(self):
+            return
+        pages = self._pages()
+        try:
+            for page in pages:
+                page = [item for item in page if is_new(item)]
+                if self.requested_count is not None:
+                    page = page[:self.requested_count - self.returned]
+                yield page
+                self.returned += len(page)
+                if _count_met(self):
+                    return
+        finally:
+            pages.close()
+
+    def flow(self) -> 'Flow':
+        '''Start a lazy map/filter/batch/limit pipeline over pages of this ShardedPaginator'''
+        return Flow(self.pages)
+
+    def __iter__(self):
+        for page in self.pages():
+            yield from page
+
+
+class Flow:
+    '''
+    Lazy pipeline of map/filter/batch/limit stages applied page by page to a stream of pages
+    Every stage method returns a new Flow, leaving the original one intact
+    Arguments:
+        pages: function returning an iterator of pages (lists of items) e.g. Paginator.pages
+    Usage:
+        >>> Paginator(url, period='1d').flow().filter(is_news).map(enrich, threads=16).batch(100).limit(10)
+    '''
+    def __init__(self, pages: Callable[[], Iterator[list]], stages: Tuple[Callable, ...] = ()):
+        self._pages = pages
+        self._stages = stages
+
+    def _then(self, stage: Callable[[Iterator[list]], Iterator[list]]) -> 'Flow':
+        return Flow(self._pages, self._stages + (stage,))
+
+    def map(self, func: Callable, threads: Optional[int] = None) -> 'Flow':
+        '''
+        Apply func to every item
+        If threads is specified, items of a page are mapped concurrently in a thread pool
+        (worth it for I/O heavy functions e.g. enrichment requests), preserving their order
+        '''
+        if threads is None:
+            def stage(pages):
+                for page in pages:
+                    yield [func(item) for item in page]
+        else:
+            def stage(pages):
+                with ThreadPoolExecutor(max_workers=threads) as executor:
+                    for page in pages:
+                        yield list(executor.map(func, page))
+        return self._then(stage)
+
+    def filter(self, func: Callable[[Any], bool]) -> 'Flow':
+        '''Keep only items for which func returns True'''
+        def stage(pages):
+            for page in pages:
+                yield [item for item in page if func(item)]
+        return self._then(stage)
+
+    def batch(self, size: int) -> 'Flow':
+        '''Group items into lists of `size` items (the last one may be shorter), which become items of further stages'''
+        def stage(pages):
+            pending = []
+            for page in pages:
+                pending.extend(page)
+                full = len(pending) - len(pending) % size
+                yield [pending[start:start + size] for start in range(0, full, size)]
+                pending = pending[full:]
+            if pending:
+                yield [pending]
+        return self._then(stage)
+
+    def limit(self, count: int) -> 'Flow':
+        '''Stop after `count` items, without requesting any further pages'''
+        def stage(pages):
+            left = count
+            if left <= 0:
+                return
+            for page in pages:
+                page = page[:left]
+                yield page
+                left -= len(page)
+                if left <= 0:
+                    return
+        return self._then(stage)
+
+    def __iter__(self):
+        pages = self._pages()
+        for stage in self._stages:
+            pages = stage(pages)
+        try:
+            for page in pages:
+                yield from page
+        finally:
+            pages.close()
+
+    def end(self) -> list:
+        '''Run the pipeline and return a list of its items'''
+        return list(self)
+
+
+def _count_met(paginator) -> bool:
+    '''Check whether paginator has already returned as many items as requested'''
+    if paginator.requested_count is not None and paginator.returned >= paginator.requested_count:
+        log.info(
+            'Requested count %s met - stopping...',
+            paginator.requested_count
+        )
+        return True
+    return False
+
+
+def split_range(after: int, before: int, shards: int) -> List[Tuple[int, int]]:
+    '''
+    Split after..before range into at most `shards` (after, before) ranges, newest first
+    Adjacent ranges share their boundary timestamp
+    Usage:
+        >>> split_range(0, 100, 4)
+        [(75, 100), (50, 75), (25, 50), (0, 25)]
+    '''
+    step = max(1, -(-(before - after) // shards))
+    starts = range(after, max(before, after + 1), step)
+    return [(start, min(start + step, before)) for start in reversed(starts)]
+
+
+class _WorkerError:
+    '''Wraps an error raised in a pagination thread, so it can be re-raised by the consumer'''
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+_END_OF_PAGES = object()
+
+
+def _put_until_stopped(pages: queue.Queue, value: Any, stop: threading.Event) -> bool:
+    '''Put value into a bounded queue, giving up if stop is set while waiting for a free slot'''
+    while not stop.is_set():
+        try:
+            pages.put(value, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
@@ -1,12 +1,15 @@
 '''Module containing helper functions and classes associated with json module and format'''
-from typing import Union, Any
+from typing import Union, Any, Iterable, Generator
 from decimal import Decimal
+import codecs
 
 import simplejson as json
 
 from .files import read
 
 JsonPayload = Union[str, bytes]
+_WHITESPACE = frozenset(' \t\n\r')
+_DELIMITERS = _WHITESPACE | frozenset(',]')
 
 
 def load(payload: JsonPayload) -> Any:
@@ -24,3 +27,65 @@ def dump(payload: Any) -> str:
 def read_json(filename: str) -> Any:
     '''Reads a json file and outputs its python representation'''
     return load(read(filename))
+
+def iter_array(chunks: Iterable[JsonPayload]) -> Generator[Any, None, None]:
+    '''
+    Incrementally decode a JSON array from an iterable of str or bytes (utf-8) chunks
+    yielding its elements as soon as they are fully read
+    Usage:
+        >>> list(iter_array(['[1, {"a"', ': 2}, ', '"b"]']))
+        [1, {'a': 2}, 'b']
+    '''
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buffer = ''
+    pos = 0
+    exhausted = False
+    expecting = '['
+    while True:
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        if pos < len(buffer):
+            char = buffer[pos]
+            if expecting == '[':
+                if char != '[':
+                    raise json.JSONDecodeError('Expecting "["', buffer, pos)
+                pos += 1
+                expecting = 'first'
+                continue
+            if expecting == 'separator':
+                if char == ']':
+                    return
+                if char != ',':
+                    raise json.JSONDecodeError('Expecting "," or "]"', buffer, pos)
+                pos += 1
+                expecting = 'value'
+                continue
+            if expecting == 'first' and char == ']':
+                return
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if exhausted:
+                    raise
+            else:
+                # A value is only known to be complete once it is followed by a delimiter,
+                # otherwise it may be cut short e.g. 12 of 123 or 1 of 1.5
+                if exhausted or end < len(buffer) and buffer[end] in _DELIMITERS:
+                    pos = end
+                    expecting = 'separator'
+                    yield value
+                    continue
+        elif exhausted:
+            raise json.JSONDecodeError('Unexpected end of JSON array', buffer, pos)
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            exhausted = True
+            chunk = utf8.decode(b'', final=True)
+        else:
+            if isinstance(chunk, bytes):
+                chunk = utf8.decode(chunk)
+        buffer = buffer[pos:] + chunk
+        pos = 0
@@ -1,21 +1,39 @@
 '''Requests helper functions and classes'''
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple, Union, Mapping
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from email.utils import parsedate_to_datetime
+from dataclasses import dataclass
+from collections import deque, namedtuple
 from functools import wraps
+import threading
+import inspect
 import logging
+import sqlite3
 import time
 
+import simplejson as json
+
 from requests.packages.urllib3.util.retry import Retry
 from requests.adapters import HTTPAdapter
 from requests import *
+from requests.structures import CaseInsensitiveDict
+from requests.exceptions import RetryError
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool, port_by_scheme
+from urllib3.poolmanager import PoolManager
+from urllib3.exceptions import MaxRetryError, ResponseError
+from urllib3.util import parse_url
 
 from ._import import get_caller_module
-from .url import make_url, query_to_str
+from .cache import LRUCache
+from .url import make_url, query_to_str, parse
 
 log = logging.getLogger(__name__)
 
 
 def restart_on_connerr(func):
     '''
-    Method decorator catches ConnectionError and resets object's 'session'
+    Method decorator catches ConnectionError and evicts connection pool of the failing host
+    from object's 'session' (or resets the whole 'session' if the host is unknown)
     Must be called on a method!
     '''
     @wraps(func)
@@ -24,9 +42,18 @@ def restart_on_connerr(func):
         while retries < 2:
             try:
                 return func(self, *a, **kw)
-            except ConnectionError:
-                log.exception('Restarting on ConnectionError')
-                self.reset_session()
+            except ConnectionError as exc:
+                budget = getattr(self, 'retry_budget', None)
+                if budget is not None and not budget.withdraw():
+                    log.warning('Not retrying on ConnectionError, retry budget is exhausted')
+                    raise
+                request = getattr(exc, 'request', None)
+                if request is not None and request.url and hasattr(self, 'evict_pool'):
+                    log.exception('Evicting connection pool of %s on ConnectionError', request.url)
+                    self.evict_pool(request.url)
+                else:
+                    log.exception('Restarting on ConnectionError')
+                    self.reset_session()
                 time.sleep(2 ** retries)
                 retries += 1
         return func(self, *a, **kw)
@@ -44,6 +71,521 @@ def request_repr(request: dict) -> str:
     _repr = f"{request['method']}: {url_with_params}{payload_repr}"
     return _repr
 
+def cache_control(header: Optional[str]) -> Dict[str, Optional[str]]:
+    '''
+    Parse Cache-Control header into a dict of its lowercase directives
+    Usage:
+        >>> cache_control('public, max-age=300, no-cache="Set-Cookie"')
+        {'public': None, 'max-age': '300', 'no-cache': 'Set-Cookie'}
+    '''
+    directives = {}
+    for directive in (header or '').split(','):
+        name, _, value = directive.strip().partition('=')
+        if name:
+            directives[name.lower()] = value.strip('"') if value else None
+    return directives
+
+
+@dataclass
+class CachedResponse:
+    '''Response stored in ResponseCache together with its freshness and validators'''
+    url: str
+    status_code: int
+    headers: dict
+    content: bytes
+    encoding: Optional[str] = None
+    reason: Optional[str] = None
+    expires: float = 0
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    generated: float = 0
+
+    @property
+    def fresh(self) -> bool:
+        '''Can the response be used without revalidation?'''
+        return time.time() < self.expires
+
+    @property
+    def age(self) -> float:
+        '''Seconds since the response was generated (or last revalidated) by the origin server'''
+        return time.time() - self.generated
+
+    def to_response(self) -> Response:
+        '''Build a requests.Response out of the cached response'''
+        response = Response()
+        response.url = self.url
+        response.status_code = self.status_code
+        response.headers = CaseInsensitiveDict(self.headers)
+        response._content = self.content # pylint: disable=protected-access
+        response.encoding = self.encoding
+        response.reason = self.reason
+        response.from_cache = True
+        return response
+
+
+CacheMetrics = namedtuple('CacheMetrics', ['hits', 'misses', 'revalidated', 'stored', 'memory_size'])
+
+
+class ResponseCache:
+    '''
+    HTTP response cache used by Requests (see Requests' cache argument), keyed on request_repr
+    It honours Cache-Control (max-age, no-cache, no-store), Expires, ETag and Last-Modified headers
+    of responses, and no-store, no-cache and max-age directives of requests' Cache-Control header
+    Stale responses with a validator are revalidated with If-None-Match/If-Modified-Since requests
+    Responses are kept in a bounded in-memory LRU cache and optionally in an sqlite database
+    Arguments:
+        maxsize:   maximum number of responses held in memory
+        path:      path of an sqlite database storing responses on disk
+        statuses:  status codes of responses which can be cached
+    Usage:
+        >>> requests = Requests(cache=ResponseCache(maxsize=1000, path='responses.sqlite'))
+        >>> requests.get('https://inyourarea.co.uk').from_cache
+        False
+        >>> requests.get('https://inyourarea.co.uk').from_cache
+        True
+        >>> requests.cache.info()
+        CacheMetrics(hits=1, misses=1, revalidated=0, stored=1, memory_size=1)
+    '''
+    CACHEABLE_STATUSES = frozenset((200, 203, 300, 301, 308, 404, 410))
+    def __init__(
+            self,
+            maxsize: int = 1024,
+            path: Optional[str] = None,
+            statuses: Iterable[int] = CACHEABLE_STATUSES
+    ):
+        self.memory = LRUCache(maxsize)
+        self.path = path
+        self.statuses = frozenset(statuses)
+        self.hits = self.misses = self.revalidated = self.stored = 0
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            with self._db:
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT, content BLOB)'
+                )
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        '''Get response stored under key (fresh or not) from memory or disk'''
+        cached = self.memory.get(key)
+        if cached is None and self._db is not None:
+            with self._lock:
+                row = self._db.execute('SELECT response, content FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                cached = CachedResponse(content=row[1], **json.loads(row[0]))
+                self.memory[key] = cached
+        return cached
+
+    def set(self, key: str, cached: CachedResponse) -> None:
+        '''Store response under key in memory and on disk'''
+        self.memory[key] = cached
+        if self._db is not None:
+            fields = {name: value for name, value in vars(cached).items() if name != 'content'}
+            with self._lock, self._db:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO responses VALUES (?, ?, ?)',
+                    (key, json.dumps(fields), cached.content)
+                )
+
+    def store(self, key: str, response: Response) -> Optional[CachedResponse]:
+        '''Store response under key if its status and headers allow it'''
+        directives = cache_control(response.headers.get('Cache-Control'))
+        if response.status_code not in self.statuses or 'no-store' in directives:
+            return None
+        cached = CachedResponse(
+            url=response.url,
+            status_code=response.status_code,
+            headers=dict(response.headers),
+            content=response.content,
+            encoding=response.encoding,
+            reason=response.reason,
+            expires=self.expires(response.headers),
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified'),
+            generated=self.generated(response.headers)
+        )
+        if not cached.fresh and cached.etag is None and cached.last_modified is None:
+            return None
+        self.set(key, cached)
+        self.count('stored')
+        return cached
+
+    def revalidate(self, key: str, cached: CachedResponse, response: Response) -> CachedResponse:
+        '''Refresh cached response with headers of a 304 Not Modified response'''
+        headers = CaseInsensitiveDict(cached.headers)
+        # Age of the stored response is outdated by the revalidation
+        headers.pop('Age', None)
+        headers.update(response.headers)
+        cached = CachedResponse(**{
+            **vars(cached),
+            'headers': dict(headers),
+            'expires': self.expires(headers),
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'generated': self.generated(headers)
+        })
+        self.set(key, cached)
+        self.count('revalidated')
+        return cached
+
+    @staticmethod
+    def generated(headers: Mapping[str, str]) -> float:
+        '''Get timestamp at which a response with headers was generated, taking its Age header into account'''
+        try:
+            age = int(CaseInsensitiveDict(headers).get('Age') or 0)
+        except ValueError:
+            age = 0
+        return time.time() - age
+
+    @staticmethod
+    def expires(headers: Mapping[str, str]) -> float:
+        '''Get timestamp until which a response with headers is fresh'''
+        headers = CaseInsensitiveDict(headers)
+        directives = cache_control(headers.get('Cache-Control'))
+        now = time.time()
+        if 'no-cache' in directives:
+            return now
+        try:
+            age = int(headers.get('Age') or 0)
+            if 'max-age' in directives:
+                return now + int(directives['max-age']) - age
+            if 'Expires' in headers:
+                expires = parsedate_to_datetime(headers['Expires']).timestamp()
+                date = parsedate_to_datetime(headers['Date']).timestamp() if 'Date' in headers else now
+                return now + expires - date - age
+        except (TypeError, ValueError):
+            pass
+        return now
+
+    def count(self, metric: str) -> None:
+        '''Increment one of hits, misses, revalidated or stored counters'''
+        with self._stats_lock:
+            setattr(self, metric, getattr(self, metric) + 1)
+
+    def info(self) -> CacheMetrics:
+        '''Get cache statistics'''
+        with self._stats_lock:
+            return CacheMetrics(self.hits, self.misses, self.revalidated, self.stored, len(self.memory))
+
+    def clear(self) -> None:
+        '''Remove all stored responses and reset statistics'''
+        self.memory.clear()
+        with self._stats_lock:
+            self.hits = self.misses = self.revalidated = self.stored = 0
+        if self._db is not None:
+            with self._lock, self._db:
+                self._db.execute('DELETE FROM responses')
+
+    def close(self) -> None:
+        '''Close the sqlite database (if there is one)'''
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+PoolStats = namedtuple(
+    'PoolStats',
+    ['maxsize', 'in_use', 'idle', 'requests', 'new_connections', 'reuse_ratio', 'discarded', 'wait_time']
+)
+
+
+class _InstrumentedPoolMixin:
+    '''
+    Mixin of urllib3 connection pools counting connection checkouts, new connections,
+    connections discarded because the pool was full, and time spent waiting for a connection
+    '''
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self._stats_lock = threading.Lock()
+        self.checkouts = self.new_connections = self.discarded = 0
+        self.wait_time = 0.0
+
+    def _get_conn(self, timeout=None):
+        start = time.perf_counter()
+        try:
+            return super()._get_conn(timeout)
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_time += waited
+
+    def _new_conn(self):
+        with self._stats_lock:
+            self.new_connections += 1
+        return super()._new_conn()
+
+    def _put_conn(self, conn):
+        if conn is not None and self.pool is not None and self.pool.full():
+            with self._stats_lock:
+                self.discarded += 1
+        return super()._put_conn(conn)
+
+    def stats(self) -> PoolStats:
+        '''Get current occupancy and lifetime counters of the pool'''
+        queue = self.pool
+        maxsize = queue.maxsize if queue is not None else 0
+        idle = sum(conn is not None for conn in list(queue.queue)) if queue is not None else 0
+        in_use = maxsize - queue.qsize() if queue is not None else 0
+        with self._stats_lock:
+            checkouts, new_connections = self.checkouts, self.new_connections
+            return PoolStats(
+                maxsize=maxsize,
+                in_use=in_use,
+                idle=idle,
+                requests=checkouts,
+                new_connections=new_connections,
+                reuse_ratio=1 - new_connections / checkouts if checkouts else 0.0,
+                discarded=self.discarded,
+                wait_time=self.wait_time
+            )
+
+
+class InstrumentedHTTPConnectionPool(_InstrumentedPoolMixin, HTTPConnectionPool):
+    '''HTTPConnectionPool collecting PoolStats'''
+
+
+class InstrumentedHTTPSConnectionPool(_InstrumentedPoolMixin, HTTPSConnectionPool):
+    '''HTTPSConnectionPool collecting PoolStats'''
+
+
+class HostPoolManager(PoolManager):
+    '''
+    PoolManager creating instrumented connection pools,
+    with maxsize of pools of hosts in pool_sizes overriding the default one
+    '''
+    def __init__(self, *a, pool_sizes: Optional[Mapping[str, int]] = None, **kw):
+        super().__init__(*a, **kw)
+        self.pool_sizes = {host.lower(): size for host, size in (pool_sizes or {}).items()}
+        self.pool_classes_by_scheme = {
+            'http': InstrumentedHTTPConnectionPool,
+            'https': InstrumentedHTTPSConnectionPool
+        }
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        if host.lower() in self.pool_sizes:
+            request_context = dict(request_context or self.connection_pool_kw)
+            request_context['maxsize'] = self.pool_sizes[host.lower()]
+        return super()._new_pool(scheme, host, port, request_context)
+
+
+class HostPoolAdapter(HTTPAdapter):
+    '''
+    HTTPAdapter with per-host connection pool sizes, which collects PoolStats of its pools
+    Arguments:
+        pool_sizes: maximum numbers of connections kept open to hosts, e.g. {'inyourarea.co.uk': 50}
+        other arguments are passed to HTTPAdapter
+    '''
+    __attrs__ = HTTPAdapter.__attrs__ + ['pool_sizes']
+    def __init__(self, *a, pool_sizes: Optional[Mapping[str, int]] = None, **kw):
+        self.pool_sizes = dict(pool_sizes or {})
+        super().__init__(*a, **kw)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        self.poolmanager = HostPoolManager(
+            num_pools=connections,
+            maxsize=maxsize,
+            block=block,
+            pool_sizes=self.pool_sizes,
+            **pool_kwargs
+        )
+
+    def pool_stats(self) -> Dict[str, PoolStats]:
+        '''Get PoolStats of the adapter's open connection pools keyed by their "<scheme>://<host>:<port>"'''
+        stats = {}
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                stats[f'{key.key_scheme}://{key.key_host}:{key.key_port}'] = pool.stats()
+        return stats
+
+
+RetryBudgetInfo = namedtuple('RetryBudgetInfo', ['requests', 'retries', 'rejected', 'tokens'])
+
+
+class RetryBudget:
+    '''
+    Token bucket shared by requests, which caps their retries at a fraction of all requests made
+    Every request deposits ratio of a token and every retry withdraws a whole one,
+    while min_per_second retries a second are allowed regardless of the traffic
+    Arguments:
+        ratio:          fraction of requests that can be retried
+        min_per_second: number of retries a second allowed even with little traffic
+        max_tokens:     maximum number of tokens that can be saved up for a burst of retries
+    Usage:
+        >>> budget = RetryBudget(ratio=0.1)
+        >>> requests = Requests(retry_budget=budget)
+        >>> budget.info()
+        RetryBudgetInfo(requests=0, retries=0, rejected=0, tokens=0.0)
+    '''
+    def __init__(self, ratio: float = 0.1, min_per_second: float = 1, max_tokens: float = 100):
+        if ratio < 0:
+            raise ValueError(f'Retry budget ratio has to be non-negative, got {ratio}')
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.tokens = 0.0
+        self.requests = self.retries = self.rejected = 0
+        self._reserve = float(min_per_second)
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        '''Record a request'''
+        with self._lock:
+            self.requests += 1
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        '''Record a retry if the budget allows it and return whether it does'''
+        with self._lock:
+            now = time.monotonic()
+            self._reserve = min(
+                self.min_per_second,
+                self._reserve + (now - self._refilled) * self.min_per_second
+            )
+            self._refilled = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+            elif self._reserve >= 1:
+                self._reserve -= 1
+            else:
+                self.rejected += 1
+                return False
+            self.retries += 1
+            return True
+
+    def info(self) -> RetryBudgetInfo:
+        '''Get numbers of requests, retries and rejected retries, and tokens left'''
+        with self._lock:
+            return RetryBudgetInfo(self.requests, self.retries, self.rejected, self.tokens)
+
+
+_RETRY_TAKES_BACKOFF_MAX = 'backoff_max' in inspect.signature(Retry.__init__).parameters
+
+
+class BudgetedRetry(Retry):
+    '''
+    urllib3 Retry, which stops retrying (as if it was exhausted) once budget runs out
+    Redirects are not charged to the budget
+    backoff_max is supported with urllib3<2 too, whose Retry doesn't take it as an argument
+    '''
+    def __init__(self, *a, budget: Optional[RetryBudget] = None, backoff_max: Optional[float] = None, **kw):
+        if backoff_max is not None and _RETRY_TAKES_BACKOFF_MAX:
+            kw['backoff_max'] = backoff_max
+        super().__init__(*a, **kw)
+        self.budget = budget
+        self._backoff_max = backoff_max
+        if backoff_max is not None and not _RETRY_TAKES_BACKOFF_MAX:
+            # urllib3<2 reads maximum backoff from (what is meant to be) a class attribute
+            self.DEFAULT_BACKOFF_MAX = self.BACKOFF_MAX = backoff_max
+
+    def new(self, **kw):
+        kw.setdefault('budget', self.budget)
+        if not _RETRY_TAKES_BACKOFF_MAX:
+            kw.setdefault('backoff_max', self._backoff_max)
+        return super().new(**kw)
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        redirected = retry.history and retry.history[-1].redirect_location
+        if self.budget is not None and not redirected and not self.budget.withdraw():
+            log.warning('Not retrying %s %s, retry budget is exhausted', method, url)
+            reason = error or ResponseError('retry budget exhausted')
+            raise MaxRetryError(_pool, url, reason) from reason
+        return retry
+
+
+class CircuitOpenError(RequestException):
+    '''Request was not made, because circuit of its host is open'''
+
+
+class CircuitBreaker:
+    '''
+    Per-host circuit breaker
+    A host's circuit opens after failure_threshold consecutive failed requests
+    (connection errors, timeouts, exhausted retries and 5xx responses),
+    and then its requests fail fast with CircuitOpenError for recovery_time seconds
+    After that the circuit is half-open: up to probes_no requests are let through,
+    and it closes once one of them succeeds or opens again if one fails
+    Arguments:
+        failure_threshold: number of consecutive failures opening a circuit
+        recovery_time:     seconds after which an open circuit lets probe requests through
+        probes_no:         number of concurrent probe requests of a half-open circuit
+    Usage:
+        >>> requests = Requests(circuit_breaker=CircuitBreaker(failure_threshold=3))
+        >>> requests.get('https://down.inyourarea.co.uk') # three times
+        >>> requests.circuit_breaker.states()
+        {'https://down.inyourarea.co.uk:443': 'open'}
+    '''
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+    def __init__(self, failure_threshold: int = 5, recovery_time: float = 30, probes_no: int = 1):
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.probes_no = probes_no
+        self._circuits: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host(url: str) -> str:
+        '''Get "<scheme>://<host>:<port>" of url, which circuits are kept for'''
+        parsed = parse_url(url)
+        scheme = (parsed.scheme or 'http').lower()
+        return f'{scheme}://{(parsed.host or "").lower()}:{parsed.port or port_by_scheme.get(scheme)}'
+
+    def before(self, host: str) -> None:
+        '''Raise CircuitOpenError unless a request to host can be made'''
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is None or circuit['state'] == self.CLOSED:
+                return
+            if circuit['state'] == self.OPEN:
+                if time.monotonic() - circuit['opened'] < self.recovery_time:
+                    raise CircuitOpenError(f'Circuit of {host} is open')
+                log.info('Circuit of %s is half-open', host)
+                circuit['state'], circuit['probes'] = self.HALF_OPEN, 0
+            if circuit['probes'] >= self.probes_no:
+                raise CircuitOpenError(f'Circuit of {host} is half-open and already probing')
+            circuit['probes'] += 1
+
+    def record(self, host: str, success: Optional[bool]) -> None:
+        '''Record outcome of a request to host (None if it neither succeeded nor failed)'''
+        with self._lock:
+            circuit = self._circuits.setdefault(
+                host, {'state': self.CLOSED, 'failures': 0, 'opened': 0.0, 'probes': 0}
+            )
+            if circuit['state'] == self.HALF_OPEN:
+                circuit['probes'] = max(circuit['probes'] - 1, 0)
+            if success is None:
+                return
+            if success:
+                if circuit['state'] != self.CLOSED:
+                    log.info('Circuit of %s is closed', host)
+                circuit['state'], circuit['failures'] = self.CLOSED, 0
+                return
+            circuit['failures'] += 1
+            if circuit['state'] == self.HALF_OPEN or circuit['failures'] >= self.failure_threshold:
+                if circuit['state'] != self.OPEN:
+                    log.warning('Circuit of %s is open after %d failures', host, circuit['failures'])
+                circuit['state'], circuit['opened'] = self.OPEN, time.monotonic()
+
+    def state(self, host: str) -> str:
+        '''Get state of host's circuit'''
+        with self._lock:
+            circuit = self._circuits.get(host)
+            return self.CLOSED if circuit is None else circuit['state']
+
+    def states(self) -> Dict[str, str]:
+        '''Get states of all circuits'''
+        with self._lock:
+            return {host: circuit['state'] for host, circuit in self._circuits.items()}
+
 
 class Requests:
     '''
@@ -58,14 +600,46 @@ class Requests:
                          retry is triggered
         raise_on_status: after the number of retries is greater than max_retries,
                          should an error be thrown or rather a bad response returned
+        cache:           ResponseCache caching GET and HEAD responses (or True for a default one)
+        coalesce:        should concurrent identical GET, HEAD and OPTIONS requests share
+                         a single in-flight request (and the very same Response object)
+        pool_size:       maximum number of connections kept open to a single host
+        pool_sizes:      maximum numbers of connections kept open to specific hosts
+                         e.g. {'inyourarea.co.uk': 50}
+        pool_block:      should requests wait for a free connection when all of host's
+                         pool_size connections are in use, instead of opening (and then discarding)
+                         an extra one
+        backoff_factor:  retry number n sleeps for backoff_factor * 2 ** (n - 1) seconds
+        backoff_max:     maximum number of seconds a retry sleeps for (urllib3's default if None)
+        retry_budget:    RetryBudget capping retries at a fraction of all requests
+                         (or True for a default one), which can be shared between Requests
+        circuit_breaker: CircuitBreaker failing requests to failing hosts fast
+                         (or True for a default one)
+    Connection pools are instrumented, see Requests.pool_stats
     '''
     DEFAULT_STATUS_FORCELIST = frozenset((400, 403, 500, 502, 503, 504))
+    POOL_SIZE = 300
+    CACHEABLE_METHODS = frozenset(('GET', 'HEAD'))
+    # requests with any other keyword arguments (e.g. auth or cookies) are never cached
+    CACHED_ARGUMENTS = frozenset(('url', 'params', 'headers', 'timeout', 'allow_redirects'))
+    COALESCED_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+    # requests with any other keyword arguments (e.g. auth or cookies) are never coalesced
+    COALESCED_ARGUMENTS = frozenset(('url', 'params', 'headers', 'timeout', 'allow_redirects'))
     def __init__(
             self,
             max_retries=5,
             retry_on=(),
             accept_on=(),
-            raise_on_status=False
+            raise_on_status=False,
+            cache: Union[ResponseCache, bool, None] = None,
+            coalesce: bool = False,
+            pool_size: int = POOL_SIZE,
+            pool_sizes: Optional[Mapping[str, int]] = None,
+            pool_block: bool = False,
+            backoff_factor: float = 1,
+            backoff_max: Optional[float] = None,
+            retry_budget: Union[RetryBudget, bool, None] = None,
+            circuit_breaker: Union[CircuitBreaker, bool, None] = None
     ):
         retry_on = self.DEFAULT_STATUS_FORCELIST.union(set(retry_on))
         self.status_forcelist = frozenset(
@@ -76,28 +650,240 @@ class Requests:
         self._caller_module = get_caller_module()
         self.max_retries = max_retries
         self.raise_on_status = raise_on_status
+        self.cache = ResponseCache() if cache is True else cache or None
+        self.coalesce = coalesce
+        self.pool_size = pool_size
+        self.pool_sizes = dict(pool_sizes or {})
+        self.pool_block = pool_block
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.retry_budget = RetryBudget() if retry_budget is True else retry_budget or None
+        self.circuit_breaker = CircuitBreaker() if circuit_breaker is True else circuit_breaker or None
+        self._in_flight: Dict[str, Future] = {}
+        self._in_flight_lock = threading.Lock()
         self.session = None
+        self._session_lock = threading.Lock()
         self.reset_session()
 
     def reset_session(self):
-        '''Resets self.session'''
+        '''
+        Replaces self.session with a new one
+        The old session isn't closed, so that requests other threads are making with it can finish
+        '''
         log.info('Setting/Resetting session for Requests called from module %s', self._caller_module)
-        self.session = Session()
-        retries = Retry(
+        session = Session()
+        retries = BudgetedRetry(
             total=self.max_retries,
             connect=0,
-            backoff_factor=1,
+            backoff_factor=self.backoff_factor,
+            backoff_max=self.backoff_max,
             status_forcelist=self.status_forcelist,
-            raise_on_status=True
+            raise_on_status=True,
+            budget=self.retry_budget
+        )
+        adapter = HostPoolAdapter(
+            pool_connections=self.POOL_SIZE,
+            pool_maxsize=self.pool_size,
+            pool_block=self.pool_block,
+            pool_sizes=self.pool_sizes,
+            max_retries=retries
         )
-        adapter = HTTPAdapter(pool_connections=300, pool_maxsize=300, max_retries=retries)
-        self.session.mount('http://', adapter)
-        self.session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        with self._session_lock:
+            self.session = session
+
+    def pool_stats(self) -> Dict[str, PoolStats]:
+        '''
+        Get PoolStats of self.session's connection pools keyed by their "<scheme>://<host>:<port>":
+            maxsize:         maximum number of connections kept open to the host
+            in_use:          number of connections currently checked out of the pool
+            idle:            number of open connections waiting in the pool
+            requests:        number of connection checkouts (one per request, including retries)
+            new_connections: number of connections opened
+            reuse_ratio:     fraction of requests served with an already open connection
+            discarded:       number of connections closed because the pool was full
+                             (when it grows, pool_size of the host is too small)
+            wait_time:       total seconds spent waiting for a free connection (with pool_block=True)
+        urllib3 doesn't pipeline HTTP/1.1 requests, so a connection serves one request at a time
+        and in_use is the number of requests to the host in flight
+        Usage:
+            >>> requests = Requests(pool_sizes={'inyourarea.co.uk': 20})
+            >>> requests.get('https://inyourarea.co.uk')
+            >>> requests.pool_stats()
+            {'https://inyourarea.co.uk:443': PoolStats(maxsize=20, in_use=0, idle=1, requests=1, ...)}
+        '''
+        with self._session_lock:
+            adapters = list(self.session.adapters.values())
+        stats = {}
+        for adapter in adapters:
+            if isinstance(adapter, HostPoolAdapter):
+                stats.update(adapter.pool_stats())
+        return stats
+
+    def evict_pool(self, url: str) -> int:
+        '''
+        Remove connection pools of url's host from self.session, so that next requests
+        to the host open new connections, while connections to other hosts are kept alive
+        Requests in flight with an evicted pool finish normally and close their connections afterwards
+        Returns number of evicted pools
+        '''
+        parsed = parse_url(url)
+        scheme = (parsed.scheme or 'http').lower()
+        host = (parsed.host or '').lower()
+        port = parsed.port or port_by_scheme.get(scheme)
+        evicted = 0
+        with self._session_lock:
+            adapters = list(self.session.adapters.values())
+        for adapter in adapters:
+            managers = [adapter.poolmanager, *getattr(adapter, 'proxy_manager', {}).values()]
+            for manager in managers:
+                pools = manager.pools
+                for key in pools.keys():
+                    if key.key_scheme == scheme and key.key_host == host and key.key_port == port:
+                        try:
+                            # RecentlyUsedContainer closes the pool as it's removed
+                            del pools[key]
+                            evicted += 1
+                        except KeyError: # another thread evicted it first
+                            pass
+        log.debug('Evicted %d connection pools of %s://%s:%s', evicted, scheme, host, port)
+        return evicted
 
-    @restart_on_connerr
     def request(self, method: str, *a, **kw) -> Response:
         '''Generic request method that makes an appropriate request based on request type'''
-        return self.session.request(method, *a, **kw)
+        if (
+                self.coalesce
+                and method.upper() in self.COALESCED_METHODS
+                and len(a) <= 1
+                and self.COALESCED_ARGUMENTS.issuperset(kw)
+        ):
+            return self._coalesced_request(method, *a, **kw)
+        return self._send(method, *a, **kw)
+
+    def _send(self, method: str, *a, **kw) -> Response:
+        if (
+                self.cache is not None
+                and method.upper() in self.CACHEABLE_METHODS
+                and len(a) <= 1
+                and self.CACHED_ARGUMENTS.issuperset(kw)
+        ):
+            return self._cached_request(method, *a, **kw)
+        return self._request(method, *a, **kw)
+
+    def _request(self, method: str, *a, **kw) -> Response:
+        if self.retry_budget is not None:
+            self.retry_budget.deposit()
+        return self._session_request(method, *a, **kw)
+
+    @restart_on_connerr
+    def _session_request(self, method: str, *a, **kw) -> Response:
+        if self.circuit_breaker is None:
+            return self.session.request(method, *a, **kw)
+        host = self.circuit_breaker.host(a[0] if a else kw['url'])
+        self.circuit_breaker.before(host)
+        try:
+            response = self.session.request(method, *a, **kw)
+        except (ConnectionError, Timeout, RetryError):
+            self.circuit_breaker.record(host, False)
+            raise
+        except BaseException:
+            self.circuit_breaker.record(host, None)
+            raise
+        self.circuit_breaker.record(host, response.status_code < 500)
+        return response
+
+    def _cached_request(self, method: str, *a, **kw) -> Response:
+        '''Make a request through self.cache, revalidating stale responses'''
+        kw = dict(kw, url=a[0]) if a else dict(kw)
+        request_directives = cache_control(CaseInsensitiveDict(kw.get('headers') or {}).get('Cache-Control'))
+        if 'no-store' in request_directives:
+            return self._request(method, **kw)
+        # Cache-Control of the request only steers the cache, so it doesn't make a different response
+        headers = {
+            header: value for header, value in (kw.get('headers') or {}).items()
+            if header.lower() != 'cache-control'
+        }
+        key = self._request_key(method, dict(kw, headers=headers), ('headers', 'allow_redirects'))
+        cache = self.cache
+        cached = cache.get(key)
+        try:
+            max_age = int(request_directives['max-age'])
+        except (KeyError, TypeError, ValueError):
+            max_age = None
+        if (
+                cached is not None
+                and cached.fresh
+                and 'no-cache' not in request_directives
+                and (max_age is None or cached.age <= max_age)
+        ):
+            cache.count('hits')
+            return cached.to_response()
+        cache.count('misses')
+        if cached is not None:
+            headers = kw['headers'] = dict(kw.get('headers') or {})
+            if cached.etag is not None:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified is not None:
+                headers['If-Modified-Since'] = cached.last_modified
+        response = self._request(method, **kw)
+        if response.status_code == 304 and cached is not None:
+            return cache.revalidate(key, cached, response).to_response()
+        response.from_cache = False
+        cache.store(key, response)
+        return response
+
+    def _coalesced_request(self, method: str, *a, **kw) -> Response:
+        '''
+        Make a request, unless an identical one is already in flight,
+        in which case wait for it and return its response (or raise its exception)
+        '''
+        kw = dict(kw, url=a[0]) if a else dict(kw)
+        key = self._request_key(method, kw, self.COALESCED_ARGUMENTS.difference(('url', 'params')))
+        with self._in_flight_lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+        if not leader:
+            log.debug('Waiting for in-flight request %s', key)
+            return future.result()
+        try:
+            response = self._send(method, **kw)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(response)
+            return response
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[key]
+
+    @staticmethod
+    def _request_key(method: str, kw: dict, arguments: Iterable[str] = ()) -> str:
+        '''
+        request_repr of a request made with keyword arguments kw,
+        followed by values of its other arguments (e.g. headers) which make a different response
+        '''
+        params, payload = kw.get('params'), kw.get('data')
+        key = request_repr({
+            'method': method.upper(),
+            'url': kw['url'],
+            'params': params if isinstance(params, Mapping) else {},
+            'payload': payload if isinstance(payload, Mapping) else {}
+        })
+        if params is not None and not isinstance(params, Mapping):
+            key += f'$$Params:{params!r}'
+        for argument in sorted(arguments):
+            value = kw.get(argument)
+            if argument == 'headers':
+                value = sorted((header.lower(), header_value) for header, header_value in (value or {}).items())
+            elif argument == 'allow_redirects':
+                value = value is False # redirects are followed by default
+            if value:
+                key += f'$${argument}:{value!r}'
+        return key
 
     def get(self, *a, **kw):
         '''Alias for request('get')'''
@@ -118,3 +904,106 @@ class Requests:
     def put(self, *a, **kw):
         '''Alias for request('put')'''
         return self.request('put', *a, **kw)
+
+    def map(
+            self,
+            requests: Iterable[Union[str, dict]],
+            concurrency: int = 10,
+            ordered: bool = False,
+            per_host: Optional[int] = None,
+            buffer_size: Optional[int] = None,
+            return_exceptions: bool = False
+    ) -> Iterator[Tuple[Union[str, dict], Any]]:
+        '''
+        Make many requests concurrently over the shared session, streaming back their responses
+        Arguments:
+            requests:          urls to GET, or dicts of request arguments with optional 'method'
+                               e.g. {'method': 'post', 'url': ..., 'json': {...}}
+        Keyword arguments:
+            concurrency:       number of requests made at a time (keep it within POOL_SIZE,
+                               so that all of them reuse pooled connections)
+            ordered:           yield responses in the order of requests instead of as they complete
+            per_host:          maximum number of requests made to a single host at a time
+            buffer_size:       maximum number of requests taken from requests and not yielded yet
+                               (defaults to 4 * concurrency), which bounds memory use
+            return_exceptions: yield exceptions in place of failed requests' responses
+                               instead of raising the first one
+        Returns:
+            iterator of (request, response) tuples
+        Usage:
+            >>> for url, response in Requests().map(urls, concurrency=50, per_host=4):
+            ...     print(url, response.status_code)
+        '''
+        if buffer_size is None:
+            buffer_size = 4 * concurrency
+        if concurrency < 1 or buffer_size < 1 or (per_host is not None and per_host < 1):
+            raise ValueError('concurrency, per_host and buffer_size have to be positive')
+        requests = iter(enumerate(requests))
+        exhausted = False
+        pending: Dict[Optional[str], deque] = {}
+        turns: deque = deque()
+        in_flight: Dict[Optional[str], int] = {}
+        futures: Dict[Future, Tuple[int, Optional[str], Union[str, dict]]] = {}
+        finished: Dict[int, Tuple[Union[str, dict], Any]] = {}
+        taken = yielded = 0
+        executor = ThreadPoolExecutor(concurrency)
+        try:
+            while True:
+                while not exhausted and taken - yielded < buffer_size:
+                    try:
+                        index, request = next(requests)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    taken += 1
+                    host = parse(request if isinstance(request, str) else request['url'], 'host')
+                    if host not in pending:
+                        pending[host] = deque()
+                        turns.append(host)
+                    pending[host].append((index, request))
+                # Hosts take turns, so that one host's requests don't hold up the others
+                submitted = True
+                while submitted and turns and len(futures) < concurrency:
+                    submitted = False
+                    for _ in range(len(turns)):
+                        if len(futures) >= concurrency:
+                            break
+                        host = turns.popleft()
+                        if per_host is None or in_flight.get(host, 0) < per_host:
+                            index, request = pending[host].popleft()
+                            in_flight[host] = in_flight.get(host, 0) + 1
+                            futures[executor.submit(self._map_request, request)] = (index, host, request)
+                            submitted = True
+                        if pending[host]:
+                            turns.append(host)
+                        else:
+                            del pending[host]
+                if not futures:
+                    return
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, host, request = futures.pop(future)
+                    in_flight[host] -= 1
+                    error = future.exception()
+                    if error is not None and not return_exceptions:
+                        raise error
+                    finished[index] = (request, error if error is not None else future.result())
+                if ordered:
+                    while yielded in finished:
+                        yield finished.pop(yielded)
+                        yielded += 1
+                else:
+                    for index in sorted(finished):
+                        yield finished.pop(index)
+                        yielded += 1
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def _map_request(self, request: Union[str, dict]):
+        '''Make a request given as a url or a dict of request arguments'''
+        if isinstance(request, str):
+            return self.get(request)
+        request = dict(request)
+        return self.request(request.pop('method', 'get'), **request)
@@ -1,18 +1,34 @@
 '''Helper functions for operations on urls'''
-from typing import Union, List, Dict, Optional, Any
+from typing import Union, List, Dict, Optional, Any, Tuple, Callable, Iterable, Iterator, Mapping
+from urllib.parse import unquote_plus
+from functools import wraps, partial
+from collections import deque
+from operator import itemgetter
+import multiprocessing
+import threading
 import logging
-import copy
-import re
+import os
+
+from .cache import LRUCache, CacheInfo
+from .hash import FingerprintSet, BloomFilter, fingerprint
 
 URL_REGEX = (
     r'^(?P<scheme>https?:\/\/)?'
     r'(?P<host>[a-zA-Z0-9][a-zA-Z0-9\.\-]*\.[a-zA-Z0-9\.\-]*(?<![\.\-]))'
     r'(?P<port>:[0-9]{1,5})?'
-    r'(?P<path>[^?\s#&]*)'
-    r'(?P<query>\?[^#\s&]*\=[^#\s&]*(?:&[^#\s&]*\=[^#\s&]*)*)?'
+    r'(?P<path>[^?\s#]*)'
+    r'(?P<query>\?[^#\s]*)?'
     r'(?P<fragment>[^\s]*)$'
 )
 DEFAULT_SCHEMA = ['scheme', 'host', 'port', 'path', 'query', 'fragment']
+_COMPONENT_INDEX = {component: index for index, component in enumerate(DEFAULT_SCHEMA)}
+_HOST_CHARS = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789.-'
+_HOST_FIRST_CHARS = frozenset(_HOST_CHARS[:-2])
+_DIGITS = '0123456789'
+PUBLIC_SUFFIX_LIST = os.path.join(os.path.dirname(__file__), 'data', 'public_suffix_list.dat')
+# Suffixes under which every subdomain is a separate site, even though they are not public suffixes
+EXTRA_PUBLIC_SUFFIXES = ('wordpress.com',)
+# Kept for backward compatibility - domain uses the public suffix list instead
 SECOND_LEVEL_DOMAINS = {sld.split('.')[0] for sld in (
     'ac.uk',
     'bl.uk',
@@ -47,64 +63,283 @@ SECOND_LEVEL_DOMAINS = {sld.split('.')[0] for sld in (
 
 log = logging.getLogger(__name__)
 
+_cache: Optional[LRUCache] = None
+_MISSING = object()
+
 
-def make_url(url: str, params: dict) -> str:
+def enable_cache(maxsize: int = 65536) -> LRUCache:
     '''
-    Converts base url and params into a url
+    Memoize results of domain and iurl in a thread-safe LRU cache holding
+    at most maxsize results (replaces the previous cache if there was one)
+    Usage:
+        >>> cache = enable_cache(100000)
+        >>> domain('https://www.max.com/max'); domain('https://www.max.com/max')
+        'max.com'
+        'max.com'
+        >>> cache_info()
+        CacheInfo(hits=1, misses=1, maxsize=100000, currsize=1)
+    '''
+    global _cache # pylint: disable=global-statement,invalid-name
+    _cache = LRUCache(maxsize)
+    return _cache
+
+def disable_cache() -> None:
+    '''Stop memoizing domain and iurl results and drop the cache'''
+    global _cache # pylint: disable=global-statement,invalid-name
+    _cache = None
+
+def cache_info() -> Optional[CacheInfo]:
+    '''Get hits, misses, maxsize and current size of the cache or None if it is disabled'''
+    cache = _cache
+    return None if cache is None else cache.info()
+
+def _hashable(value: Any) -> Any:
+    if isinstance(value, list):
+        return tuple(value)
+    if isinstance(value, tuple):
+        return tuple(map(_hashable, value))
+    return value
+
+def _cached(func: Callable) -> Callable:
+    '''Memoize func's results in the module's LRU cache, when it's enabled'''
+    @wraps(func)
+    def _wrapper(url, *args, **kwargs):
+        cache = _cache
+        if cache is None:
+            return func(url, *args, **kwargs)
+        key = (func, url.url if isinstance(url, ParsedUrl) else url, *args)
+        if kwargs:
+            key += tuple(sorted(kwargs.items()))
+        try:
+            value = cache.get(key, _MISSING)
+        except TypeError:
+            # e.g. a list of query keys passed to iurl
+            key = _hashable(key)
+            value = cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = cache[key] = func(url, *args, **kwargs)
+        return value
+    return _wrapper
+
+
+def make_url(url: Union[str, 'ParsedUrl'], params: Union[Mapping, Iterable[Tuple[str, Any]]]) -> str:
+    '''
+    Converts base url and params into a url (see query_to_str)
+    If url is a ParsedUrl, params replace the same keys in its own query
     Usage:
         >>> make_url('http://max.com/max', {'max': 1, 'what': 'no'})
         'http://max.com/max?max=1&what=no'
+        >>> make_url(ParsedUrl('http://max.com/max?max=0&a=1&a=2#top'), {'max': 1, 'what': 'no'})
+        'http://max.com/max?a=1&a=2&max=1&what=no#top'
     '''
+    if isinstance(url, ParsedUrl):
+        if not url.valid:
+            return make_url(url.url, params)
+        params = _query_items(params)
+        replaced = {key for key, _ in params}
+        query_str = query_to_str([
+            *((key, value) for key, value in query_to_pairs(url) if key not in replaced),
+            *params
+        ])
+        return f'{url.get("scheme host port path")}{query_str}{url.fragment}'
     if not params:
         return url
-    param_str = '&'.join(f'{k}={v}' for k, v in sorted(params.items(), key=lambda x: x[0]))
-    return f'{url}?{param_str}'
+    return f'{url}{query_to_str(params)}'
 
-def query_to_dict(query_str: str) -> Dict[str, str]:
+def query_to_pairs(query_str: Union[str, 'ParsedUrl'], *, decode: bool = False) -> List[Tuple[str, str]]:
     '''
-    Convert url query component to dictionary
+    Split url query component (or ParsedUrl's query) into a list of (key, value) pairs
+    Repeated keys are all kept in their order, keys without = get blank values
+    and empty pairs are skipped
+    Keyword arguments:
+        decode: percent-decode keys and values (and replace + with space)
+    Usage:
+        >>> query_to_pairs('?a=1&a=2&b&c==&d=%3D+')
+        [('a', '1'), ('a', '2'), ('b', ''), ('c', '='), ('d', '%3D+')]
+        >>> query_to_pairs('?d=%3D+', decode=True)
+        [('d', '= ')]
+    '''
+    if isinstance(query_str, ParsedUrl):
+        query_str = query_str.query or ''
+    if query_str.startswith('?'):
+        query_str = query_str[1:]
+    # partition gives (key, '=', value) and [::2] of it - (key, value)
+    pairs = [pair.partition('=')[::2] for pair in query_str.split('&') if pair]
+    if decode and ('%' in query_str or '+' in query_str):
+        return [(unquote_plus(key), unquote_plus(value)) for key, value in pairs]
+    return pairs
+
+def query_to_dict(
+        query_str: Union[str, 'ParsedUrl'],
+        *,
+        decode: bool = False,
+        multi: bool = False
+) -> Dict[str, Union[str, List[str]]]:
+    '''
+    Convert url query component (or ParsedUrl's query) to dictionary
+    Keyword arguments:
+        decode: percent-decode keys and values (see query_to_pairs)
+        multi:  map keys to lists of all their values, instead of the last one
     Usage:
         >>> query_to_dict('?max=max&foo=bar')
         {'max': 'max', 'foo': 'bar'}
         >>> query_to_dict('?')
         {}
+        >>> query_to_dict(ParsedUrl('max.com/?max=max&max=min&foo'), multi=True)
+        {'max': ['max', 'min'], 'foo': ['']}
     '''
-    if len(query_str) > 1:
-        return dict(q.split('=') for q in query_str[1:].split('&'))
-    return {}
+    pairs = query_to_pairs(query_str, decode=decode)
+    if not multi:
+        return dict(pairs)
+    query_dict: Dict[str, Any] = {}
+    for key, value in pairs:
+        query_dict.setdefault(key, []).append(value)
+    return query_dict
 
-def query_to_str(query_dict: Dict[str, Any]) -> str:
+def query_to_str(query: Union[Mapping, Iterable[Tuple[str, Any]], None]) -> str:
     '''
-    Convert a key-value mapping to url query format (with query keys sorted)
+    Convert a key-value mapping (or a list of key-value pairs) to url query format
+    in its canonical form - with keys sorted and values of each key kept in order
+    List and tuple values are converted to a repeated key
     Usage:
         >>> query_to_str({'max': 'max', 'foo': 'bar'})
         '?foo=bar&max=max'
+        >>> query_to_str([('max', 'max'), ('foo', ['a', 'b'])])
+        '?foo=a&foo=b&max=max'
     '''
-    if query_dict:
-        return '?' + '&'.join(
-            f'{key}={value}'
-            for key, value in sorted(
-                query_dict.items(),
-                key=lambda item: item[0]
-            )
-        )
+    if query:
+        return '?' + '&'.join([f'{key}={value}' for key, value in _query_items(query)])
     return ''
 
-def no_www(url: str) -> str:
+def _query_items(query: Union[Mapping, Iterable[Tuple[str, Any]]]) -> List[Tuple[str, Any]]:
+    '''Flatten query into a list of key-value pairs sorted by key'''
+    pairs = []
+    for key, value in query.items() if isinstance(query, Mapping) else query:
+        if isinstance(value, (list, tuple)):
+            pairs.extend((key, item) for item in value)
+        else:
+            pairs.append((key, value))
+    pairs.sort(key=itemgetter(0))
+    return pairs
+
+def no_www(url: Union[str, 'ParsedUrl']) -> str:
     '''
     Removes www. from the front of string if it's there
+    For a ParsedUrl www. is removed from the front of its host
     Usage:
         >>> no_www('max.com')
         'max.com'
         >>> no_www('www.max.com')
         'max.com'
+        >>> no_www(ParsedUrl('https://www.max.com/max'))
+        'https://max.com/max'
     '''
+    if isinstance(url, ParsedUrl):
+        if not url.valid:
+            return url.url
+        return f'{url.scheme or ""}{no_www(url.host)}{url.get("port path query fragment")}'
     if url[:4] == 'www.':
         return url[4:]
     return url
 
+class ParsedUrl:
+    '''
+    Immutable url which is parsed lazily, on first access to any of its components,
+    and at most once
+    It can be passed to parse, domain, iurl, no_www, query_to_dict and make_url
+    instead of a url string to avoid parsing the same url over and over
+    Arguments:
+        url: url to be parsed
+    Usage:
+        >>> url = ParsedUrl('https://www.max.com/max?max=1')
+        >>> url.host, url.path
+        ('www.max.com', '/max')
+        >>> domain(url), iurl(url)
+        ('max.com', 'max.com/max')
+    '''
+    __slots__ = ('url', '_parts')
+
+    def __init__(self, url: str):
+        object.__setattr__(self, 'url', url)
+
+    @property
+    def parts(self) -> Optional[Tuple[Optional[str], ...]]:
+        '''Tuple of url's components (as in DEFAULT_SCHEMA) or None if url can't be parsed'''
+        try:
+            return self._parts
+        except AttributeError:
+            parts = _split_url(self.url)
+            object.__setattr__(self, '_parts', parts)
+            return parts
+
+    @property
+    def valid(self) -> bool:
+        '''Could the url be parsed?'''
+        return self.parts is not None
+
+    @property
+    def scheme(self) -> Optional[str]:
+        '''Url's scheme e.g. https://'''
+        return self._component(0)
+
+    @property
+    def host(self) -> Optional[str]:
+        '''Url's host e.g. www.max.com'''
+        return self._component(1)
+
+    @property
+    def port(self) -> Optional[str]:
+        '''Url's port e.g. :8080'''
+        return self._component(2)
+
+    @property
+    def path(self) -> Optional[str]:
+        '''Url's path e.g. /max'''
+        return self._component(3)
+
+    @property
+    def query(self) -> Optional[str]:
+        '''Url's query e.g. ?max=1'''
+        return self._component(4)
+
+    @property
+    def fragment(self) -> Optional[str]:
+        '''Url's fragment e.g. #max'''
+        return self._component(5)
+
+    def _component(self, index: int) -> Optional[str]:
+        parts = self.parts
+        return None if parts is None else parts[index]
+
+    def get(self, components: Optional[Union[str, List[str]]] = None, *, as_dict: bool = False):
+        '''Same as parse(self, components, as_dict=as_dict)'''
+        return parse(self, components, as_dict=as_dict)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __eq__(self, other):
+        if isinstance(other, ParsedUrl):
+            return self.url == other.url
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.url)
+
+    def __str__(self):
+        return self.url
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.url!r})'
+
+    def __reduce__(self):
+        return type(self), (self.url,)
+
 def parse(
-        url: str,
+        url: Union[str, ParsedUrl],
         components: Optional[Union[str, List[str]]] = None,
         *,
         as_dict: bool = False
@@ -112,7 +347,7 @@ def parse(
     '''
     Parses url and returns parsed url in requested format
     Arguments:
-        url: url to be parsed
+        url: url to be parsed (or an already parsed ParsedUrl)
     Keyword arguments:
         components: how should the output be formatted (or which field to include in case of as_dict=True)
                     Choose from: scheme, host, port, path, query, fragment
@@ -120,39 +355,89 @@ def parse(
                  If False it's going to be returned as string
     '''
     if components is None:
-        components = copy.copy(DEFAULT_SCHEMA)
+        components = DEFAULT_SCHEMA
     elif not isinstance(components, list):
         components = components.split()
-    _url = url.strip().replace(' ', '%20')
-    if not url:
-        return None
-    match = re.search(URL_REGEX, _url)
-    if match is None:
+    split = _split_url(url)
+    if split is None:
         return None
-    components = [
-        (component, match.group(component))
-        for component in components
-    ]
     if as_dict:
-        components = dict(components)
+        components = {
+            component: split[_COMPONENT_INDEX[component]]
+            for component in components
+        }
         if 'query' in components and components['query'] is not None:
             components['query'] = query_to_dict(components['query'])
         return components
-    return ''.join(comp_match for comp, comp_match in components if comp_match)
+    return ''.join(split[_COMPONENT_INDEX[component]] or '' for component in components)
 
-def iurl(url, query: Union[List[str], bool] = False):
+def _split_url(url: Union[str, ParsedUrl]) -> Optional[Tuple[Optional[str], ...]]:
+    '''Split url the way parse does, returning None if it can't be parsed'''
+    if isinstance(url, ParsedUrl):
+        return url.parts
+    if not url:
+        return None
+    return _split(url.strip().replace(' ', '%20'))
+
+def _split(url: str) -> Optional[Tuple[Optional[str], ...]]:
+    '''
+    Split url into (scheme, host, port, path, query, fragment) in a single left-to-right scan
+    Components missing from the url are None, except for path and fragment which are ''
+    Equivalent to matching URL_REGEX, but without backtracking
+    and using only str methods implemented in C
+    '''
+    if url.endswith('\n'):
+        # URL_REGEX's $ matches before a trailing newline as well
+        url = url[:-1]
+    # URL_REGEX's groups can't hold whitespace and together they span the whole url
+    if url.split(None, 1) != [url]:
+        return None
+    if url.startswith('https://'):
+        scheme = 'https://'
+        rest = url[8:]
+    elif url.startswith('http://'):
+        scheme = 'http://'
+        rest = url[7:]
+    else:
+        scheme = None
+        rest = url
+    tail = rest.lstrip(_HOST_CHARS)
+    host = rest[:len(rest) - len(tail)].rstrip('.-')
+    if not host or host[0] not in _HOST_FIRST_CHARS or '.' not in host:
+        return None
+    if len(host) != len(rest) - len(tail):
+        tail = rest[len(host):]
+    port = None
+    if tail.startswith(':'):
+        digits = tail[1:6]
+        digits = digits[:len(digits) - len(digits.lstrip(_DIGITS))]
+        if digits:
+            port = ':' + digits
+            tail = tail[len(port):]
+    # path runs up to the query or the fragment and the query up to the fragment
+    fragment_start = tail.find('#')
+    if fragment_start == -1:
+        fragment_start = len(tail)
+    query_start = tail.find('?', 0, fragment_start)
+    if query_start == -1:
+        return scheme, host, port, tail[:fragment_start], None, tail[fragment_start:]
+    return scheme, host, port, tail[:query_start], tail[query_start:fragment_start], tail[fragment_start:]
+
+
+@_cached
+def iurl(url: Union[str, ParsedUrl], query: Union[List[str], bool] = False):
     '''
     Convert url to a normalized form
     1. domain
     2. path
     3. query depending on the 'query' keyword argument
     Arguments:
-        url: url to be normalized
+        url: url (or ParsedUrl) to be normalized
     Keyword arguments:
         query: can be specified as either a list or a boolean
-                - list: specify which query members should be included,
-                        and in what order
+                - list: specify which query members should be included
                 - bool: include full sorted query or do not include query (True/False)
+               repeated query keys are all kept
     Usage:
         >>> iurl('https://inyourarea.co.uk/news/foo-bar-article?some=query&other=query2')
         'inyourarea.co.uk/news/foo-bar-article'
@@ -161,32 +446,32 @@ def iurl(url, query: Union[List[str], bool] = False):
         >>> iurl('https://inyourarea.co.uk/news/foo-bar-article?some=query&other=query2', query=['some'])
         'inyourarea.co.uk/news/foo-bar-article?some=query'
     '''
-    slugs = parse(url, components=['path'])
-    if query:
-        query_dict = parse(url, components=['query'], as_dict=True)['query']
+    _, host, _, slugs, query_component, _ = _split_url(url) or (None,) * len(DEFAULT_SCHEMA)
+    if query and query_component:
+        pairs = query_to_pairs(query_component)
         if isinstance(query, list):
-            query_str = query_to_str({
-                key: query_dict[key]
-                for key in query
-            })
-        else:
-            query_str = query_to_str(query_dict)
+            pairs = [(key, value) for key, value in pairs if key in query]
+        query_str = query_to_str(pairs)
     else:
         query_str = ''
-    _domain = domain(url, level=10)
+    _domain = _host_domain(host, level=10)
+    if _domain is None:
+        log.info('Url: %s could not be parsed!!!', url)
     _iurl = f'{_domain}{slugs}{query_str}'
     if _iurl[-1] == '/':
         _iurl = _iurl[:-1]
     return _iurl
 
 
-def domain(url, level=2):
+@_cached
+def domain(url: Union[str, ParsedUrl], level: Optional[int] = 2):
     '''
     Extract domain from url
     Arguments:
-        url:   url from which to extract the domain
-        level: what is the maximum level of domain to capture
+        url:   url (or ParsedUrl) from which to extract the domain
+        level: what is the maximum level of domain to capture counting public suffix as level 1
                i.e. level 1: .com, level 2: google.com, level 3: drive.google.com
+               or level 1: .co.uk, level 2: bbc.co.uk
                if None, no limit is applied
     Usage:
         >>> domain('https://drive.google.com')
@@ -194,15 +479,282 @@ def domain(url, level=2):
         >>> domain('https://drive.google.com', level=3)
         'drive.google.com'
     '''
-    _domain = parse(url, 'host')
-    if _domain is None:
+    split = _split_url(url)
+    if split is None:
         log.info('Url: %s could not be parsed!!!', url)
         return None
-    _domain = no_www(_domain)
+    return _host_domain(split[1], level)
+
+def _host_domain(host: Optional[str], level: Optional[int]) -> Optional[str]:
+    '''Cut parsed host down to a domain of the given level (see domain)'''
+    if host is None:
+        return None
+    _domain = no_www(host)
     if level is None:
         return _domain
     split = _domain.split('.')
-    if len(split) >= 2 and split[-2] in SECOND_LEVEL_DOMAINS:
-        level += 1
-    level = min(level, len(split))
+    level = min(level + _suffix_labels_no(split if _domain.islower() else _domain.lower().split('.')) - 1, len(split))
     return '.'.join(split[-level:])
+
+def public_suffix(host: str) -> str:
+    '''
+    Get the public suffix of host according to the public suffix list
+    (hosts with unknown top level domains have their last label as the suffix)
+    Usage:
+        >>> public_suffix('www.bbc.co.uk')
+        'co.uk'
+        >>> public_suffix('news.sky.com')
+        'com'
+    '''
+    split = host.split('.')
+    return '.'.join(split[-_suffix_labels_no(host.lower().split('.')):])
+
+# Public suffix trie is made of nested dicts keyed by labels in reversed order
+# e.g. co.uk is trie['uk']['co'], and since labels can't contain dots or exclamation marks
+# node['.'] marks a node which ends a rule, and node['!'] one which ends an exception rule
+# Wildcards only ever appear as the leftmost label of a rule, so node['*'] is always a leaf
+_suffix_trie: Optional[dict] = None
+_suffix_trie_lock = threading.Lock()
+
+def _suffix_labels_no(labels: List[str]) -> int:
+    '''Get the number of labels making up the public suffix of a lowercase domain split into labels'''
+    node = _suffix_trie or _load_suffix_trie()
+    suffix_labels_no = 1
+    for depth, label in enumerate(reversed(labels), 1):
+        child = node.get(label)
+        if child is None:
+            return depth if '*' in node else suffix_labels_no
+        if '.' in child:
+            suffix_labels_no = depth
+        elif '!' in child:
+            return depth - 1
+        node = child
+    return suffix_labels_no
+
+def _load_suffix_trie() -> dict:
+    '''Build the public suffix trie from PUBLIC_SUFFIX_LIST (only once)'''
+    global _suffix_trie # pylint: disable=global-statement,invalid-name
+    with _suffix_trie_lock:
+        if _suffix_trie is None:
+            trie: dict = {}
+            with open(PUBLIC_SUFFIX_LIST, encoding='utf-8') as psl:
+                rules = [line.split(None, 1)[0] for line in psl if line.strip() and not line.startswith('//')]
+            for rule in (*rules, *EXTRA_PUBLIC_SUFFIXES):
+                marker = '.'
+                if rule.startswith('!'):
+                    marker, rule = '!', rule[1:]
+                for labels in {rule.lower(), _to_ascii(rule)}:
+                    node = trie
+                    for label in reversed(labels.split('.')):
+                        node = node.setdefault(label, {})
+                    node[marker] = True
+            _mark_wildcard_matches(trie)
+            _suffix_trie = trie
+    return _suffix_trie
+
+def _mark_wildcard_matches(node: dict) -> None:
+    '''Mark children of nodes with a wildcard rule as ending a rule too, unless they end an exception'''
+    wildcard = '*' in node
+    for label, child in node.items():
+        if isinstance(child, dict):
+            if wildcard and '!' not in child:
+                child['.'] = True
+            _mark_wildcard_matches(child)
+
+def _to_ascii(rule: str) -> str:
+    '''Convert an internationalized rule to its punycode form (hosts are parsed in that form)'''
+    try:
+        return '.'.join(
+            label if label == '*' else label.encode('idna').decode('ascii')
+            for label in rule.lower().split('.')
+        )
+    except UnicodeError:
+        return rule.lower()
+
+
+def iurl_many(
+        urls: Iterable[Union[str, ParsedUrl]],
+        query: Union[List[str], bool] = False,
+        *,
+        processes: Optional[int] = None,
+        chunksize: int = 10000
+) -> List[str]:
+    '''
+    Normalize each of urls with iurl, parsing every distinct url only once
+    Arguments:
+        urls: iterable of urls, e.g. a list, a numpy array or a pandas column
+    Keyword arguments:
+        query:     see iurl
+        processes: if given, distinct urls are normalized by a pool of that many processes
+                   (only when there are more than chunksize of them)
+        chunksize: number of urls sent to a worker process at once
+    Returns:
+        list of normalized urls aligned with urls
+    Usage:
+        >>> iurl_many(['https://max.com/max?a=1', 'max.com/max/', 'https://max.com/max?a=1'])
+        ['max.com/max', 'max.com/max', 'max.com/max']
+    '''
+    return _many(partial(iurl, query=query), urls, processes, chunksize)
+
+def domain_many(
+        urls: Iterable[Union[str, ParsedUrl]],
+        level: Optional[int] = 2,
+        *,
+        processes: Optional[int] = None,
+        chunksize: int = 10000
+) -> List[Optional[str]]:
+    '''
+    Extract domain from each of urls, parsing every distinct url only once
+    Arguments and keyword arguments are the same as in iurl_many, except for level (see domain)
+    Usage:
+        >>> domain_many(['https://drive.google.com', 'google.com', 'https://drive.google.com'])
+        ['google.com', 'google.com', 'google.com']
+    '''
+    return _many(partial(domain, level=level), urls, processes, chunksize)
+
+def _many(func: Callable, urls: Iterable, processes: Optional[int], chunksize: int) -> list:
+    '''Apply func to every distinct url once and return its results aligned with urls'''
+    urls = list(urls)
+    distinct = list(dict.fromkeys(urls))
+    if processes and len(distinct) > chunksize:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(func, distinct, chunksize=chunksize)
+    else:
+        results = list(map(func, distinct))
+    by_url = dict(zip(distinct, results))
+    return [by_url[url] for url in urls]
+
+
+def host_batches(
+        urls: Iterable[Union[str, ParsedUrl]],
+        batch_size: int = 10,
+        buffer_size: int = 10000,
+        level: Optional[int] = 2
+) -> Iterator[Tuple[Optional[str], list]]:
+    '''
+    Group a stream of urls into batches of urls sharing a domain, emitted round-robin across domains
+    (so that consecutive requests to a host can reuse a connection, while hosts are visited in turns)
+    Every url is parsed once and at most buffer_size urls are held in memory - when the buffer is full,
+    a batch is emitted for the next domain in turn, so batches of rare domains can be smaller
+    Arguments:
+        urls:        iterable of urls (unparsable ones are grouped under None)
+        batch_size:  maximum number of urls in a batch
+        buffer_size: maximum number of urls held before emitting a batch
+        level:       level of domains urls are grouped by (see domain)
+    Returns:
+        iterator of (domain, urls) tuples
+    Usage:
+        >>> urls = ['a.com/1', 'a.com/2', 'b.com/1', 'a.com/3', 'b.com/2']
+        >>> list(host_batches(urls, batch_size=2))
+        [('a.com', ['a.com/1', 'a.com/2']), ('b.com', ['b.com/1', 'b.com/2']), ('a.com', ['a.com/3'])]
+    '''
+    if batch_size < 1 or buffer_size < 1:
+        raise ValueError('batch_size and buffer_size have to be positive')
+    queues: Dict[Optional[str], deque] = {}
+    turns: deque = deque()
+    buffered = 0
+    def next_batch() -> Tuple[Optional[str], list]:
+        nonlocal buffered
+        host = turns.popleft()
+        queue = queues[host]
+        batch = [queue.popleft() for _ in range(min(batch_size, len(queue)))]
+        buffered -= len(batch)
+        if queue:
+            turns.append(host)
+        else:
+            del queues[host]
+        return host, batch
+    for url in urls:
+        host = domain(url, level=level)
+        queue = queues.get(host)
+        if queue is None:
+            queue = queues[host] = deque()
+            turns.append(host)
+        queue.append(url)
+        buffered += 1
+        if buffered >= buffer_size:
+            yield next_batch()
+    while turns:
+        yield next_batch()
+
+
+class UrlFrontier:
+    '''
+    Index of visited urls for de-duplicating crawl frontiers
+    Urls are normalized with iurl and only 64- or 128-bit fingerprints of the normalized urls
+    are stored (in an ion.hash.FingerprintSet), which takes about 12-24 bytes per url
+    Urls which can't be parsed are fingerprinted as they are
+    Arguments:
+        bits:     bit length of fingerprints (with 64 bits, the chance of any false duplicate
+                  among 100 million urls is about 0.03%, with 128 bits it's negligible)
+        capacity: expected number of urls
+        path:     path of a file storing the fingerprints, so that they persist between runs
+        bloom:    check a Bloom filter sized for capacity urls before the fingerprint set
+                  (worth it when the set is stored in a file much larger than memory)
+        query:    query argument passed to iurl (see iurl)
+    Usage:
+        >>> frontier = UrlFrontier()
+        >>> frontier.add('https://www.max.com/max?a=1'), frontier.add('max.com/max/')
+        (True, False)
+        >>> list(frontier.filter(['max.com/max', 'max.com/min', 'http://max.com/min']))
+        ['max.com/min']
+    '''
+    def __init__(
+            self,
+            bits: int = 64,
+            capacity: int = 1 << 16,
+            path: Optional[str] = None,
+            bloom: bool = False,
+            query: Union[List[str], bool] = False
+    ):
+        self.bits = bits
+        self.query = query
+        self.fingerprints = FingerprintSet(bits=bits, capacity=capacity, path=path)
+        self.bloom = None
+        if bloom:
+            self.bloom = BloomFilter(max(capacity, len(self.fingerprints)))
+            for _fingerprint in self.fingerprints:
+                self.bloom.add(_fingerprint)
+
+    def fingerprint(self, url: Union[str, ParsedUrl]) -> int:
+        '''Fingerprint of url's normalized form (or of url itself if it can't be parsed)'''
+        parsed = url if isinstance(url, ParsedUrl) else ParsedUrl(url)
+        if not parsed.valid or _host_domain(parsed.host, level=10) is None:
+            return fingerprint(parsed.url, self.bits)
+        return fingerprint(iurl(parsed, query=self.query), self.bits)
+
+    def add(self, url: Union[str, ParsedUrl]) -> bool:
+        '''Mark url as visited, returning False if it was visited already'''
+        _fingerprint = self.fingerprint(url)
+        if self.bloom is not None:
+            if _fingerprint in self.bloom and _fingerprint in self.fingerprints:
+                return False
+            self.bloom.add(_fingerprint)
+        return self.fingerprints.add(_fingerprint)
+
+    def __contains__(self, url: Union[str, ParsedUrl]) -> bool:
+        _fingerprint = self.fingerprint(url)
+        if self.bloom is not None and _fingerprint not in self.bloom:
+            return False
+        return _fingerprint in self.fingerprints
+
+    def filter(self, urls: Iterable[Union[str, ParsedUrl]]) -> Iterator[Union[str, ParsedUrl]]:
+        '''Yield urls which weren't visited yet, marking them as visited'''
+        return (url for url in urls if self.add(url))
+
+    def __len__(self) -> int:
+        return len(self.fingerprints)
+
+    def flush(self) -> None:
+        '''Write visited urls' fingerprints to the file (if there is one)'''
+        self.fingerprints.flush()
+
+    def close(self) -> None:
+        '''Flush and close the file (if there is one)'''
+        self.fingerprints.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -23,6 +23,7 @@ setup(
     description="Python support package containing various utility and helper functions and classes grouped by theme",
     long_description=read("README.md"),
     packages=find_packages(),
+    package_data={'ion': ['data/public_suffix_list.dat']},
     python_requires=">=3.7",
     install_requires=[
         'requests',
@@ -0,0 +1,73 @@
+'''Testing ion.aiorequests'''
+import unittest
+import asyncio
+
+try:
+    from aiohttp import web, ClientResponseError
+    from ion.aiorequests import AsyncRequests
+except ImportError:
+    web = None
+
+
+@unittest.skipIf(web is None, 'aiohttp is not installed')
+class AsyncRequestsTestCase(unittest.TestCase):
+    '''Test case for ion.aiorequests.AsyncRequests'''
+    def run_with_server(self, test):
+        async def _run():
+            calls = {}
+            active = [0, 0]
+            async def handler(request):
+                path = request.path
+                calls[path] = calls.get(path, 0) + 1
+                active[0] += 1
+                active[1] = max(active)
+                await asyncio.sleep(0.01)
+                active[0] -= 1
+                if path.startswith('/flaky') and calls[path] < 3:
+                    return web.Response(status=503)
+                if path.startswith('/broken'):
+                    return web.Response(status=500)
+                return web.json_response({'path': path, 'query': dict(request.query)})
+            app = web.Application()
+            app.router.add_route('*', '/{tail:.*}', handler)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1] # pylint: disable=protected-access
+            try:
+                return await test(f'http://127.0.0.1:{port}', calls, active)
+            finally:
+                await runner.cleanup()
+        return asyncio.run(_run())
+
+    def test_retries_on_status(self):
+        async def test(base, calls, _):
+            async with AsyncRequests(backoff_factor=0.01) as requests:
+                response = await requests.get(f'{base}/flaky', params={'a': '1'})
+                self.assertEqual(response.status, 200)
+                self.assertEqual(await response.json(), {'path': '/flaky', 'query': {'a': '1'}})
+                self.assertEqual(calls['/flaky'], 3)
+                response = await requests.get(f'{base}/broken')
+                self.assertEqual(response.status, 500)
+                self.assertEqual(calls['/broken'], 6)
+            async with AsyncRequests(max_retries=1, raise_on_status=True, backoff_factor=0.01) as requests:
+                with self.assertRaises(ClientResponseError):
+                    await requests.get(f'{base}/broken')
+            async with AsyncRequests(accept_on=[500], backoff_factor=0.01) as requests:
+                self.assertEqual((await requests.get(f'{base}/broken')).status, 500)
+            self.assertEqual(calls['/broken'], 6 + 2 + 1)
+        self.run_with_server(test)
+
+    def test_gather_many(self):
+        async def test(base, _, active):
+            async with AsyncRequests(concurrency=5) as requests:
+                responses = await requests.gather_many(
+                    [f'{base}/get/{no}' for no in range(50)] + [{'method': 'post', 'url': f'{base}/post'}]
+                )
+            self.assertEqual(
+                [(await response.json())['path'] for response in responses],
+                [f'/get/{no}' for no in range(50)] + ['/post']
+            )
+            self.assertLessEqual(active[1], 5)
+        self.run_with_server(test)
@@ -0,0 +1,40 @@
+'''Testing ion.cache'''
+import unittest
+import threading
+
+from ion.cache import LRUCache
+
+
+class LRUCacheTestCase(unittest.TestCase):
+    '''Test case for ion.cache.LRUCache'''
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache['a'] = 1
+        cache['b'] = 2
+        self.assertEqual(cache['a'], 1)
+        cache['c'] = 3
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.get('b', 'default'), 'default')
+        with self.assertRaises(KeyError):
+            cache['b'] # pylint: disable=pointless-statement
+        self.assertEqual(tuple(cache.info()), (1, 2, 2, 2))
+
+    def test_thread_safe(self):
+        cache = LRUCache(100)
+        def worker(offset):
+            for no in range(2000):
+                key = (no + offset) % 300
+                if cache.get(key) is None:
+                    cache[key] = key
+        threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        info = cache.info()
+        self.assertEqual(info.hits + info.misses, 8 * 2000)
+        self.assertEqual(info.currsize, 100)
+
+    def test_invalid_maxsize(self):
+        with self.assertRaises(ValueError):
+            LRUCache(0)
@@ -0,0 +1,83 @@
+'''Testing ion.hash'''
+import unittest
+import tempfile
+import os
+
+from hypothesis import given
+import hypothesis.strategies as st
+
+from ion.hash import FingerprintSet, BloomFilter, fingerprint
+
+
+class FingerprintSetTestCase(unittest.TestCase):
+    '''Test case for ion.hash.FingerprintSet'''
+    @given(st.lists(st.integers(min_value=1, max_value=(1 << 128) - 1)), st.sampled_from([64, 128]))
+    def test_behaves_like_set(self, fingerprints, bits):
+        fingerprints = [_fingerprint & ((1 << bits) - 1) or 1 for _fingerprint in fingerprints]
+        fingerprint_set = FingerprintSet(bits=bits, capacity=1)
+        self.assertEqual(
+            [fingerprint_set.add(_fingerprint) for _fingerprint in fingerprints],
+            [_fingerprint not in fingerprints[:no] for no, _fingerprint in enumerate(fingerprints)]
+        )
+        self.assertEqual(len(fingerprint_set), len(set(fingerprints)))
+        self.assertEqual(set(fingerprint_set), set(fingerprints))
+        self.assertTrue(all(_fingerprint in fingerprint_set for _fingerprint in fingerprints))
+
+    def test_persists(self):
+        fingerprints = [fingerprint(no, bits=128) for no in range(5000)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'visited.fps')
+            with FingerprintSet(bits=128, capacity=100, path=path) as fingerprint_set:
+                fingerprint_set.update(fingerprints[:3000])
+            with FingerprintSet(bits=128, path=path) as fingerprint_set:
+                self.assertEqual(len(fingerprint_set), 3000)
+                self.assertEqual(sum(_fingerprint in fingerprint_set for _fingerprint in fingerprints), 3000)
+            with self.assertRaises(ValueError):
+                FingerprintSet(bits=64, path=path)
+
+    def test_rejected_file_is_untouched(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'visited.fps')
+            with FingerprintSet(bits=128, path=path) as fingerprint_set:
+                fingerprint_set.add(fingerprint('max.com', bits=128))
+            other_path = os.path.join(tmpdir, 'other.txt')
+            short_path = os.path.join(tmpdir, 'short.txt')
+            with open(other_path, 'wb') as file:
+                file.write(b'not a fingerprint set, just some text' * 10)
+            with open(short_path, 'wb') as file:
+                file.write(b'short')
+            for _path, bits in ((path, 64), (other_path, 64), (short_path, 64)):
+                with open(_path, 'rb') as file:
+                    content = file.read()
+                with self.assertRaises(ValueError):
+                    FingerprintSet(bits=bits, path=_path)
+                with open(_path, 'rb') as file:
+                    self.assertEqual(file.read(), content)
+            with FingerprintSet(bits=128, path=path) as fingerprint_set:
+                self.assertIn(fingerprint('max.com', bits=128), fingerprint_set)
+
+    def test_crash_leaves_consistent_file(self):
+        fingerprints = [fingerprint(no) for no in range(1000)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'visited.fps')
+            fingerprint_set = FingerprintSet(capacity=10, path=path)
+            fingerprint_set.update(fingerprints[:700])
+            # a copy of the file taken without flushing or closing the set is what a crash would leave
+            with open(path, 'rb') as file, open(os.path.join(tmpdir, 'crashed.fps'), 'wb') as crashed:
+                crashed.write(file.read())
+            fingerprint_set.close()
+            self.assertEqual(sorted(os.listdir(tmpdir)), ['crashed.fps', 'visited.fps'])
+            with FingerprintSet(path=os.path.join(tmpdir, 'crashed.fps')) as crashed:
+                self.assertEqual(len(crashed), 700)
+                self.assertEqual(set(crashed), set(fingerprints[:700]))
+
+
+class BloomFilterTestCase(unittest.TestCase):
+    '''Test case for ion.hash.BloomFilter'''
+    def test_error_rate(self):
+        bloom = BloomFilter(10000, error_rate=0.01)
+        for no in range(10000):
+            bloom.add(fingerprint(no))
+        self.assertTrue(all(fingerprint(no) in bloom for no in range(10000)))
+        false_positives = sum(fingerprint(no) in bloom for no in range(10000, 30000))
+        self.assertLess(false_positives / 20000, 0.02)
@@ -0,0 +1,328 @@
+'''Testing ion.itemstore'''
+from unittest import mock
+import unittest
+import tempfile
+import asyncio
+import time
+import json
+import os
+
+from hypothesis import given
+import hypothesis.strategies as st
+
+from ion.itemstore import (
+    Paginator, ShardedPaginator, AsyncPaginator, executor_transport,
+    is_valid_id, are_valid_ids, find_ids,
+    Publication, CompactPublication, CompactSection, SimplifiedPublication, CompactSimplifiedPublication
+)
+
+URL = 'https://itemstore.example.com/articles'
+IID = '76b79801-8d3e-4158-a280-afb2e505adf0'
+
+ids = st.one_of( # pylint: disable=invalid-name
+    st.text(),
+    st.from_regex(r'\A[^-]{8}-[^-]{4}-[^-]{4}-[^-]{4}-[^-]{11,13}\Z'),
+    st.none()
+)
+
+
+class FakeResponse:
+    '''Minimal stand-in for requests.Response'''
+    def __init__(self, items, ok=True):
+        self.items = items
+        self.ok = ok
+        self.closed = False
+
+    def json(self):
+        return self.items
+
+    @property
+    def content(self):
+        return b'x' * (100 * len(self.items))
+
+    def iter_content(self, chunk_size=1):
+        body = json.dumps(self.items).encode()
+        for start in range(0, len(body), 7):
+            yield body[start:start + 7]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeItemStore:
+    '''Serves items the way ItemStore does - newest first, with `before` inclusive'''
+    def __init__(self, timestamps):
+        self.items = [
+            {'iid': f'iid-{no}', 'lastModifiedTime': timestamp}
+            for no, timestamp in enumerate(timestamps)
+        ]
+        self.calls = 0
+
+    def get(self, url, params, **kwargs):
+        self.calls += 1
+        matching = sorted(
+            (
+                item for item in self.items
+                if params['after'] <= item['lastModifiedTime'] <= params['before']
+            ),
+            key=lambda item: item['lastModifiedTime'],
+            reverse=True
+        )
+        return FakeResponse(matching[:params['count']])
+
+
+def make_paginator(store, **kwargs):
+    return Paginator(URL, requests=store, **kwargs)
+
+PUBLICATIONS = [
+    {
+        'name': f'publication-{no}',
+        'domain': f'https://www.publisher{no % 3}.co.uk/',
+        'publisher': 'publisher',
+        'sections': [
+            {'url': f'https://www.publisher{no % 3}.co.uk/news/{section}?page=1', 'job': {}}
+            for section in ('local', 'sport')
+        ]
+    }
+    for no in range(10)
+]
+
+
+class IdsTestCase(unittest.TestCase):
+    '''Test case for ion.itemstore id validation and extraction'''
+    @given(st.lists(ids))
+    def test_are_valid_ids_matches_is_valid_id(self, _ids):
+        self.assertEqual(are_valid_ids(_ids), [is_valid_id(_id) for _id in _ids])
+
+    @given(st.lists(ids.filter(lambda _id: _id is not None and not _id.endswith('\x00'))))
+    def test_are_valid_ids_numpy(self, _ids):
+        '''NumPy strips trailing NULs from fixed-width strings, so such ids are not generated'''
+        try:
+            import numpy as np
+        except ImportError:
+            self.skipTest('NumPy is not installed')
+        expected = [is_valid_id(_id) for _id in _ids]
+        self.assertEqual(are_valid_ids(np.array(_ids, dtype=str)).tolist(), expected)
+        self.assertEqual(are_valid_ids(np.array(_ids, dtype=object)).tolist(), expected)
+
+    def test_bytes_ids_are_invalid(self):
+        _ids = [IID.encode(), IID, b'76b79801']
+        expected = [is_valid_id(_id) for _id in _ids]
+        self.assertEqual(expected, [False, True, False])
+        self.assertEqual(are_valid_ids(_ids), expected)
+        try:
+            import numpy as np
+        except ImportError:
+            self.skipTest('NumPy is not installed')
+        self.assertEqual(are_valid_ids(np.array([IID.encode(), b'76b79801'])).tolist(), [False, False])
+        self.assertEqual(are_valid_ids(np.array(_ids, dtype=object)).tolist(), expected)
+
+    def test_find_ids(self):
+        text = f'GET /articles/{IID}?x=1 200\n{IID.upper()},{IID}0,{IID[:-1]}-{IID}'
+        self.assertEqual(find_ids(text), [IID, IID.upper()])
+        self.assertEqual(find_ids(text.encode()), [IID.encode(), IID.upper().encode()])
+
+
+class ModelsTestCase(unittest.TestCase):
+    '''Test case for ion.itemstore models'''
+    def test_from_dicts_matches_constructor(self):
+        expected = [Publication(**publication).to_dict() for publication in PUBLICATIONS]
+        for cls in (Publication, CompactPublication):
+            self.assertEqual(
+                [publication.to_dict() for publication in cls.from_dicts(PUBLICATIONS)],
+                expected
+            )
+
+    def test_compact_models_have_no_dict(self):
+        publication = CompactPublication(**PUBLICATIONS[0])
+        self.assertIsInstance(publication.sections[0], CompactSection)
+        self.assertFalse(hasattr(publication, '__dict__'))
+        self.assertFalse(hasattr(publication.sections[0], '__dict__'))
+        self.assertEqual(publication.to_dict(), Publication(**PUBLICATIONS[0]).to_dict())
+
+    def test_compact_simplified_publication(self):
+        url = 'https://www.inyourarea.co.uk/news'
+        expanded = CompactSimplifiedPublication(url).expand()
+        self.assertIsInstance(expanded, CompactPublication)
+        self.assertEqual(expanded.to_dict(), SimplifiedPublication(url).expand().to_dict())
+
+
+class PaginatorTestCase(unittest.TestCase):
+    '''Test case for ion.itemstore.Paginator'''
+    def test_returns_all_items_once(self):
+        store = FakeItemStore(range(1, 1001))
+        iids = [item['iid'] for item in make_paginator(store, batch_size=100)]
+        self.assertEqual(len(iids), 1000)
+        self.assertEqual(set(iids), {item['iid'] for item in store.items})
+
+    def test_total_count(self):
+        store = FakeItemStore(range(1, 1001))
+        items = list(make_paginator(store, batch_size=100, total_count=150))
+        self.assertEqual(len(items), 150)
+
+    def test_same_timestamp_straddling_pages(self):
+        store = FakeItemStore([*range(1, 201), *[500] * 350, *range(600, 800)])
+        paginator = make_paginator(store, batch_size=100)
+        iids = [item['iid'] for item in paginator]
+        self.assertEqual(len(iids), len(store.items))
+        self.assertEqual(set(iids), {item['iid'] for item in store.items})
+        # Only iids sharing the cursor's timestamp are kept around
+        self.assertLessEqual(len(paginator.seen), 1)
+
+    def test_adaptive_batch_size(self):
+        store = FakeItemStore(range(1, 3001))
+        paginator = make_paginator(store, batch_size=500, target_bytes=5000)
+        self.assertEqual(len(list(paginator)), 3000)
+        self.assertEqual(paginator.batch_size, 50)
+
+    def test_stream_matches_buffered(self):
+        store = FakeItemStore([*range(1, 201), *[500] * 350, *range(600, 800)])
+        buffered = [item['iid'] for item in make_paginator(store, batch_size=100)]
+        streamed = make_paginator(store, batch_size=100, stream=True, prefetch=1)
+        self.assertEqual([item['iid'] for item in streamed], buffered)
+        chunks = list(make_paginator(store, batch_size=250, stream=True).pages())
+        self.assertEqual(max(len(chunk) for chunk in chunks), Paginator.STREAM_CHUNK_SIZE)
+
+    def test_stream_latency_excludes_consumer(self):
+        store = FakeItemStore(range(1, 201))
+        paginator = make_paginator(store, batch_size=100, stream=True)
+        with mock.patch.object(paginator, '_adapt_batch_size') as adapt_batch_size:
+            for _ in paginator:
+                time.sleep(0.002)
+        self.assertTrue(adapt_batch_size.call_args_list)
+        for call in adapt_batch_size.call_args_list:
+            self.assertLess(call[0][0], 0.1)
+
+    def test_stream_closes_failed_response(self):
+        responses = [FakeResponse([], ok=False), FakeResponse([])]
+        store = mock.Mock()
+        store.get.side_effect = responses
+        with mock.patch('ion.itemstore.time.sleep'):
+            self.assertEqual(list(make_paginator(store, stream=True)), [])
+        self.assertTrue(responses[0].closed)
+
+    def test_prefetch_matches_sequential(self):
+        store = FakeItemStore(range(1, 1001))
+        sequential = [item['iid'] for item in make_paginator(store, batch_size=100)]
+        prefetched = [item['iid'] for item in make_paginator(store, batch_size=100, prefetch=2)]
+        self.assertEqual(prefetched, sequential)
+
+    def test_prefetch_stops_with_consumer(self):
+        store = FakeItemStore(range(1, 1001))
+        items = list(make_paginator(store, batch_size=100, total_count=150, prefetch=1))
+        self.assertEqual(len(items), 150)
+        # At most the requested pages plus the bounded look-ahead are fetched
+        self.assertLessEqual(store.calls, 2 + 1 + 1)
+
+
+class FlowTestCase(unittest.TestCase):
+    '''Test case for ion.itemstore.Flow'''
+    def test_stages(self):
+        store = FakeItemStore(range(1, 1001))
+        flow = (
+            make_paginator(store, batch_size=100)
+            .flow()
+            .filter(lambda item: item['lastModifiedTime'] % 2 == 0)
+            .map(lambda item: item['lastModifiedTime'], threads=4)
+            .batch(30)
+            .limit(3)
+        )
+        batches = flow.end()
+        self.assertEqual(batches, [
+            list(range(1000, 940, -2)),
+            list(range(940, 880, -2)),
+            list(range(880, 820, -2))
+        ])
+        # Only pages needed for the first 3 batches were requested
+        self.assertEqual(store.calls, 2)
+
+    def test_batch_keeps_remainder(self):
+        store = FakeItemStore(range(1, 101))
+        batches = make_paginator(store, batch_size=50).flow().batch(7).end()
+        self.assertEqual([len(batch) for batch in batches], [7] * 14 + [2])
+
+
+class PaginatorCheckpointTestCase(unittest.TestCase):
+    '''Test case for ion.itemstore.Paginator checkpoints'''
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.checkpoint = os.path.join(self.tmpdir.name, 'paginator.json')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_resumes_from_checkpoint(self):
+        store = FakeItemStore(range(1, 1001))
+        seen = []
+        with self.assertRaises(RuntimeError):
+            for item in make_paginator(store, batch_size=100, before=1000, checkpoint=self.checkpoint):
+                seen.append(item['iid'])
+                if len(seen) == 250:
+                    raise RuntimeError('Crash in the middle of the third page')
+        self.assertTrue(os.path.exists(self.checkpoint))
+        store.calls = 0
+        paginator = make_paginator(store, batch_size=100, before=1000, checkpoint=self.checkpoint)
+        # Consecutive pages overlap on one timestamp, so two pages hold 199 items
+        self.assertEqual(paginator.returned, 199)
+        processed = seen[:paginator.returned] + [item['iid'] for item in paginator]
+        self.assertEqual(len(processed), 1000)
+        self.assertEqual(set(processed), {item['iid'] for item in store.items})
+        self.assertLess(store.calls, 11)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_checkpoint_for_different_url_fails(self):
+        store = FakeItemStore(range(1, 1001))
+        for _ in zip(range(150), make_paginator(store, batch_size=100, checkpoint=self.checkpoint)):
+            pass
+        with self.assertRaises(ValueError):
+            Paginator(URL + '/other', requests=store, checkpoint=self.checkpoint)
+
+
+class AsyncPaginatorTestCase(unittest.TestCase):
+    '''Test case for ion.itemstore.AsyncPaginator'''
+    @staticmethod
+    def collect(paginator):
+        async def _collect():
+            return [item async for item in paginator]
+        return asyncio.run(_collect())
+
+    def test_matches_sync_paginator(self):
+        store = FakeItemStore(range(1, 1001))
+        async def transport(url, params):
+            await asyncio.sleep(0)
+            return store.get(url, params)
+        items = self.collect(AsyncPaginator(URL, transport=transport, batch_size=100))
+        self.assertEqual(items, list(make_paginator(store, batch_size=100)))
+
+    def test_default_transport(self):
+        store = FakeItemStore(range(1, 101))
+        paginator = AsyncPaginator(URL, transport=executor_transport(store), batch_size=30, total_count=50)
+        self.assertEqual(len(self.collect(paginator)), 50)
+
+
+class ShardedPaginatorTestCase(unittest.TestCase):
+    '''Test case for ion.itemstore.ShardedPaginator'''
+    def test_returns_all_items_once(self):
+        store = FakeItemStore(ts for ts in range(1, 1001) for _ in range(2))
+        paginator = ShardedPaginator(URL, shards=7, workers=3, requests=store, after=0, before=1000, batch_size=50)
+        iids = [item['iid'] for item in paginator]
+        self.assertEqual(len(iids), len(set(iids)))
+        self.assertEqual(set(iids), {item['iid'] for item in store.items})
+
+    def test_ordered(self):
+        store = FakeItemStore(range(1, 1001))
+        paginator = ShardedPaginator(URL, shards=5, ordered=True, requests=store, after=0, before=1000, batch_size=50)
+        timestamps = [item['lastModifiedTime'] for item in paginator]
+        self.assertEqual(timestamps, sorted(range(1, 1001), reverse=True))
+
+    def test_total_count(self):
+        store = FakeItemStore(range(1, 1001))
+        paginator = ShardedPaginator(URL, shards=4, total_count=120, requests=store, after=0, before=1000)
+        self.assertEqual(len(list(paginator)), 120)
+
+    def test_unsupported_arguments(self):
+        store = FakeItemStore(range(1, 1001))
+        for kwargs in ({'checkpoint': 'paginator.json'}, {'checkpoint_every': 2}, {'prefetch': 1}):
+            with self.assertRaises(ValueError):
+                ShardedPaginator(URL, shards=4, requests=store, **kwargs)
+        self.assertEqual(store.calls, 0)
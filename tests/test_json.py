@@ -0,0 +1,40 @@
+'''Testing ion.json'''
+import unittest
+
+from hypothesis import given
+import hypothesis.strategies as st
+import simplejson as json
+
+from ion.json import iter_array
+
+json_values = st.recursive( # pylint: disable=invalid-name
+    st.none() | st.booleans() | st.integers() | st.floats(allow_nan=False, allow_infinity=False) | st.text(),
+    lambda children: st.lists(children, max_size=3) | st.dictionaries(st.text(), children, max_size=3),
+    max_leaves=10
+)
+
+
+class IterArrayTestCase(unittest.TestCase):
+    '''Test case for ion.json.iter_array'''
+    @given(st.lists(json_values), st.integers(min_value=1, max_value=64), st.booleans())
+    def test_matches_json_loads(self, values, chunk_size, as_bytes):
+        '''Incremental decoding should not depend on how the payload is split into chunks'''
+        payload = json.dumps(values, indent=chunk_size % 3 or None)
+        if as_bytes:
+            payload = payload.encode('utf-8')
+        chunks = [payload[start:start + chunk_size] for start in range(0, len(payload), chunk_size)]
+        self.assertEqual(list(iter_array(chunks)), json.loads(payload))
+
+    def test_invalid_payload(self):
+        for payload in ('', '{}', '[1,', '[1 2]', '[tru'):
+            with self.assertRaises(json.JSONDecodeError):
+                list(iter_array([payload]))
+
+    def test_items_are_yielded_before_the_end(self):
+        def chunks():
+            yield '[{"a": 1}, '
+            raise RuntimeError('Connection lost')
+        items = iter_array(chunks())
+        self.assertEqual(next(items), {'a': 1})
+        with self.assertRaises(RuntimeError):
+            next(items)
@@ -0,0 +1,408 @@
+'''Testing ion.requests'''
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest import mock
+import unittest
+import threading
+import tempfile
+import time
+import os
+
+from ion.requests import Requests, ResponseCache, RetryBudget, CircuitBreaker, CircuitOpenError, cache_control
+from requests.exceptions import ConnectionError, RetryError # pylint: disable=redefined-builtin
+from requests.structures import CaseInsensitiveDict
+from requests import Response
+
+
+class Handler(BaseHTTPRequestHandler):
+    '''
+    Responds with the requested path, after sleeping for ?sleep=<seconds>
+    /status/<code> paths respond with the status code, /redirect paths redirect to /target,
+    /etag paths are validated with an ETag and answer If-None-Match with 304,
+    other paths get the Cache-Control header given in ?cache=<directives>
+    '''
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self): # pylint: disable=invalid-name
+        server = self.server
+        with server.lock:
+            server.calls[self.path] = server.calls.get(self.path, 0) + 1
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            if 'sleep=' in self.path:
+                time.sleep(float(self.path.split('sleep=')[1].split('&')[0]))
+            if self.path.startswith('/etag'):
+                if self.headers.get('If-None-Match') == '"v1"':
+                    self.respond(304, b'', [('ETag', '"v1"')])
+                else:
+                    self.respond(200, self.path.encode(), [('ETag', '"v1"'), ('Cache-Control', 'no-cache')])
+            elif self.path.startswith('/redirect'):
+                self.respond(302, b'', [('Location', '/target')])
+            elif self.path.startswith('/status/'):
+                self.respond(int(self.path.split('/')[2]), self.path.encode())
+            elif 'cache=' in self.path:
+                self.respond(200, self.path.encode(), [('Cache-Control', self.path.split('cache=')[1])])
+            else:
+                self.respond(200, self.path.encode())
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def respond(self, status, body, headers=()):
+        self.send_response(status)
+        for header, value in headers:
+            self.send_header(header, value)
+        if status != 304:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args): # pylint: disable=arguments-differ
+        pass
+
+
+class ServerTestCase(unittest.TestCase):
+    '''Test case running a local HTTP server'''
+    handler = Handler
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.calls = {}
+        self.server.active = self.server.max_active = 0
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base = f'http://127.0.0.1:{self.server.server_port}'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class RequestsMapTestCase(ServerTestCase):
+    '''Test case for ion.requests.Requests.map'''
+    def test_ordered(self):
+        urls = [f'{self.base}/{no}?sleep={0.05 if no % 3 else 0}' for no in range(30)]
+        results = list(Requests().map(urls, concurrency=10, ordered=True))
+        self.assertEqual([url for url, _ in results], urls)
+        self.assertEqual([response.text for _, response in results], [url[len(self.base):] for url in urls])
+        self.assertLessEqual(self.server.max_active, 10)
+        self.assertGreater(self.server.max_active, 1)
+
+    def test_per_host_and_buffer(self):
+        requests = [{'url': f'{self.base}/{no}?sleep=0.02'} for no in range(40)]
+        consumed = 0
+        def stream():
+            nonlocal consumed
+            for request in requests:
+                consumed += 1
+                yield request
+        yielded = 0
+        for _, response in Requests().map(stream(), concurrency=8, per_host=3, buffer_size=10):
+            yielded += 1
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(consumed - yielded, 10)
+        self.assertEqual(yielded, 40)
+        self.assertLessEqual(self.server.max_active, 3)
+
+    def test_exceptions(self):
+        urls = [f'{self.base}/ok', 'http://127.0.0.1:1/refused']
+        with mock.patch('ion.requests.time.sleep'):
+            results = dict(Requests().map(urls, return_exceptions=True))
+        self.assertEqual(results[urls[0]].status_code, 200)
+        self.assertIsInstance(results[urls[1]], Exception)
+
+
+class ResponseCacheTestCase(ServerTestCase):
+    '''Test case for ion.requests.ResponseCache'''
+    def test_cache_control(self):
+        self.assertEqual(
+            cache_control('Public, max-age=300, no-cache="Set-Cookie"'),
+            {'public': None, 'max-age': '300', 'no-cache': 'Set-Cookie'}
+        )
+        self.assertEqual(cache_control(None), {})
+
+    def test_fresh(self):
+        requests = Requests(cache=True)
+        url = f'{self.base}/fresh?cache=max-age=60'
+        responses = [requests.get(url) for _ in range(3)]
+        self.assertEqual([response.from_cache for response in responses], [False, True, True])
+        self.assertEqual({response.text for response in responses}, {'/fresh?cache=max-age=60'})
+        self.assertEqual(self.server.calls, {'/fresh?cache=max-age=60': 1})
+        requests.get(url, headers={'Cache-Control': 'no-store'})
+        self.assertEqual(self.server.calls, {'/fresh?cache=max-age=60': 2})
+        self.assertEqual(requests.cache.info()[:4], (2, 1, 0, 1))
+
+    def test_not_cached(self):
+        requests = Requests(cache=True)
+        for path in ('/nostore?cache=no-store', '/plain', '/expired?cache=max-age=0'):
+            self.assertFalse(requests.get(self.base + path).from_cache)
+            self.assertFalse(requests.get(self.base + path).from_cache)
+            self.assertEqual(self.server.calls[path], 2)
+        self.assertEqual(requests.cache.info().stored, 0)
+
+    def test_arguments(self):
+        requests = Requests(cache=True)
+        url = f'{self.base}/fresh?cache=max-age=60'
+        calls = lambda: self.server.calls['/fresh?cache=max-age=60']
+        requests.get(url)
+        self.assertFalse(requests.get(url, headers={'Cache-Control': 'max-age=0'}).from_cache)
+        self.assertTrue(requests.get(url, allow_redirects=True, headers={'Cache-Control': 'max-age=60'}).from_cache)
+        self.assertFalse(requests.get(url, headers={'Authorization': 'Bearer a'}).from_cache)
+        self.assertTrue(requests.get(url, headers={'authorization': 'Bearer a'}).from_cache)
+        self.assertFalse(requests.get(url, headers={'Authorization': 'Bearer b'}).from_cache)
+        self.assertFalse(requests.get(url, allow_redirects=False).from_cache)
+        self.assertEqual(calls(), 5)
+        for kw in ({'auth': ('user', 'password')}, {'cookies': {'session': 'a'}}):
+            self.assertFalse(hasattr(requests.get(url, **kw), 'from_cache'))
+        self.assertEqual(calls(), 7)
+
+    def test_age_and_validators(self):
+        cache = ResponseCache()
+        response = Response()
+        response.url, response.status_code, response._content = 'http://max.com', 200, b'max' # pylint: disable=protected-access
+        response.headers = CaseInsensitiveDict({'Cache-Control': 'max-age=600', 'Age': '30', 'Etag': '"v1"'})
+        cached = cache.store('key', response)
+        self.assertAlmostEqual(cached.age, 30, delta=1)
+        self.assertEqual(cached.etag, '"v1"')
+        not_modified = Response()
+        not_modified.status_code = 304
+        not_modified.headers = CaseInsensitiveDict({'Etag': '"v2"', 'Cache-Control': 'max-age=60'})
+        cached = cache.revalidate('key', cached, not_modified)
+        self.assertEqual(cached.etag, '"v2"')
+        self.assertEqual([header for header in cached.headers if header.lower() == 'etag'], ['Etag'])
+        self.assertAlmostEqual(cached.age, 0, delta=1)
+        self.assertTrue(cached.fresh)
+        self.assertEqual(cached.to_response().headers['Cache-Control'], 'max-age=60')
+
+    def test_revalidate(self):
+        requests = Requests(cache=True)
+        first = requests.get(f'{self.base}/etag', params={'a': 1})
+        second = requests.get(f'{self.base}/etag', params={'a': 1})
+        self.assertFalse(first.from_cache)
+        self.assertTrue(second.from_cache)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.text, first.text)
+        self.assertEqual(self.server.calls, {'/etag?a=1': 2})
+        self.assertEqual(requests.cache.info().revalidated, 1)
+
+    def test_sqlite(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'responses.sqlite')
+            url = f'{self.base}/disk?cache=max-age=60'
+            cache = ResponseCache(path=path)
+            self.assertFalse(Requests(cache=cache).get(url).from_cache)
+            cache.close()
+            cache = ResponseCache(path=path)
+            response = Requests(cache=cache).get(url)
+            cache.close()
+            self.assertTrue(response.from_cache)
+            self.assertEqual(response.text, '/disk?cache=max-age=60')
+            self.assertEqual(response.headers['Cache-Control'], 'max-age=60')
+            self.assertEqual(self.server.calls, {'/disk?cache=max-age=60': 1})
+
+
+class CoalesceTestCase(ServerTestCase):
+    '''Test case for coalescing of identical in-flight requests in ion.requests.Requests'''
+    def get_concurrently(self, requests, urls, **kw):
+        results = [None] * len(urls)
+        def get(no):
+            try:
+                results[no] = requests.get(urls[no], **kw)
+            except Exception as exc: # pylint: disable=broad-except
+                results[no] = exc
+        threads = [threading.Thread(target=get, args=(no,)) for no in range(len(urls))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_coalesced(self):
+        url = f'{self.base}/slow?sleep=0.3'
+        responses = self.get_concurrently(Requests(coalesce=True), [url] * 10)
+        self.assertEqual(self.server.calls, {'/slow?sleep=0.3': 1})
+        self.assertEqual({response.text for response in responses}, {'/slow?sleep=0.3'})
+        responses = self.get_concurrently(Requests(coalesce=True), [url] * 5, headers={'Accept': 'text/plain'})
+        self.assertEqual(self.server.calls, {'/slow?sleep=0.3': 2})
+
+    def test_arguments_in_key(self):
+        requests = Requests(coalesce=True)
+        url = f'{self.base}/redirect?sleep=0.3'
+        results = [None, None]
+        def get(no, **kw):
+            results[no] = requests.get(url, **kw)
+        threads = [
+            threading.Thread(target=get, args=(0,)),
+            threading.Thread(target=get, args=(1,), kwargs={'allow_redirects': False})
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([response.status_code for response in results], [200, 302])
+        self.assertEqual(self.server.calls['/redirect?sleep=0.3'], 2)
+
+    def test_not_coalesced(self):
+        urls = [f'{self.base}/slow?sleep=0.3'] * 5 + [f'{self.base}/other?sleep=0.3'] * 5
+        self.get_concurrently(Requests(), urls)
+        self.assertEqual(self.server.calls, {'/slow?sleep=0.3': 5, '/other?sleep=0.3': 5})
+        self.get_concurrently(Requests(coalesce=True), urls, cookies={'session': 'a'})
+        self.assertEqual(self.server.calls, {'/slow?sleep=0.3': 10, '/other?sleep=0.3': 10})
+
+    def test_exception(self):
+        requests = Requests(coalesce=True)
+        calls = []
+        def fail(*a, **kw):
+            calls.append(a)
+            time.sleep(0.2)
+            raise ValueError('failed')
+        with mock.patch.object(requests, '_send', fail):
+            results = self.get_concurrently(requests, [f'{self.base}/fail'] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(requests._in_flight, {}) # pylint: disable=protected-access
+
+
+class EvictPoolTestCase(ServerTestCase):
+    '''Test case for per-host connection pool eviction in ion.requests.Requests'''
+    def pool_hosts(self, requests):
+        return sorted(host for host, _ in self.pool_keys(requests))
+
+    def pool_keys(self, requests):
+        return {(key.key_host, key.key_port) for key in requests.session.get_adapter(self.base).poolmanager.pools.keys()}
+
+    def test_evict_pool(self):
+        requests = Requests()
+        localhost = f'http://localhost:{self.server.server_port}'
+        requests.get(f'{self.base}/a')
+        requests.get(f'{localhost}/b')
+        self.assertEqual(self.pool_hosts(requests), ['127.0.0.1', 'localhost'])
+        self.assertEqual(requests.evict_pool(f'{self.base}/other/path'), 1)
+        self.assertEqual(self.pool_hosts(requests), ['localhost'])
+        self.assertEqual(requests.evict_pool(f'{self.base}/a'), 0)
+        self.assertEqual(requests.get(f'{self.base}/c').text, '/c')
+
+    def test_connection_error(self):
+        requests = Requests()
+        session = requests.session
+        requests.get(f'{self.base}/a')
+        with mock.patch('ion.requests.time.sleep'), mock.patch.object(requests, 'reset_session') as reset_session:
+            with self.assertRaises(ConnectionError):
+                requests.get('http://127.0.0.1:1/refused')
+        reset_session.assert_not_called()
+        self.assertIs(requests.session, session)
+        self.assertIn(('127.0.0.1', self.server.server_port), self.pool_keys(requests))
+        self.assertEqual(requests.get(f'{self.base}/b').text, '/b')
+
+
+class PoolStatsTestCase(ServerTestCase):
+    '''Test case for per-host pool sizes and pool stats of ion.requests.Requests'''
+    def test_reuse(self):
+        requests = Requests()
+        for no in range(5):
+            requests.get(f'{self.base}/{no}')
+        stats = requests.pool_stats()[f'http://127.0.0.1:{self.server.server_port}']
+        self.assertEqual(stats.maxsize, Requests.POOL_SIZE)
+        self.assertEqual((stats.in_use, stats.idle, stats.requests, stats.new_connections), (0, 1, 5, 1))
+        self.assertAlmostEqual(stats.reuse_ratio, 0.8)
+        self.assertEqual(stats.discarded, 0)
+
+    def test_pool_sizes(self):
+        requests = Requests(pool_sizes={'127.0.0.1': 2}, pool_block=True)
+        urls = [f'{self.base}/{no}?sleep=0.1' for no in range(6)]
+        self.assertEqual(len(list(requests.map(urls, concurrency=6))), 6)
+        self.assertLessEqual(self.server.max_active, 2)
+        stats = requests.pool_stats()[f'http://127.0.0.1:{self.server.server_port}']
+        self.assertEqual((stats.maxsize, stats.new_connections, stats.requests), (2, 2, 6))
+        self.assertGreater(stats.wait_time, 0.1)
+        requests.get(f'http://localhost:{self.server.server_port}/other')
+        self.assertEqual(requests.pool_stats()[f'http://localhost:{self.server.server_port}'].maxsize, Requests.POOL_SIZE)
+
+    def test_discarded(self):
+        requests = Requests(pool_size=1)
+        urls = [f'{self.base}/{no}?sleep=0.1' for no in range(4)]
+        list(requests.map(urls, concurrency=4))
+        stats = requests.pool_stats()[f'http://127.0.0.1:{self.server.server_port}']
+        self.assertEqual(stats.new_connections, 4)
+        self.assertEqual(stats.discarded, 3)
+        self.assertEqual(stats.idle, 1)
+
+
+class RetryBudgetTestCase(ServerTestCase):
+    '''Test case for ion.requests.RetryBudget'''
+    def test_no_budget(self):
+        budget = RetryBudget(ratio=0, min_per_second=0)
+        with self.assertRaises(RetryError):
+            Requests(retry_budget=budget, backoff_factor=0).get(f'{self.base}/status/500')
+        self.assertEqual(self.server.calls, {'/status/500': 1})
+        self.assertEqual(budget.info(), (1, 0, 1, 0))
+
+    def test_shared_budget(self):
+        budget = RetryBudget(ratio=0.5, min_per_second=0)
+        first, second = (Requests(retry_budget=budget, backoff_factor=0) for _ in range(2))
+        self.assertEqual(first.get(f'{self.base}/ok').status_code, 200)
+        self.assertEqual(second.get(f'{self.base}/ok').status_code, 200)
+        with self.assertRaises(RetryError):
+            second.get(f'{self.base}/status/503')
+        self.assertEqual(self.server.calls['/status/503'], 2)
+        self.assertEqual(budget.info()[:3], (3, 1, 1))
+
+    def test_deposits_once_per_request(self):
+        budget = RetryBudget(ratio=0, min_per_second=10)
+        requests = Requests(retry_budget=budget)
+        with mock.patch('ion.requests.time.sleep'):
+            with self.assertRaises(ConnectionError):
+                requests.get('http://127.0.0.1:1/refused')
+        self.assertEqual(budget.info()[:3], (1, 2, 0))
+
+    def test_backoff_max(self):
+        retry = Requests(backoff_factor=10, backoff_max=3).session.get_adapter(self.base).max_retries
+        for _ in range(3):
+            retry = retry.increment('GET', '/')
+        self.assertEqual(retry.get_backoff_time(), 3)
+
+    def test_reserve(self):
+        budget = RetryBudget(ratio=0, min_per_second=2)
+        self.assertEqual([budget.withdraw() for _ in range(3)], [True, True, False])
+        time.sleep(0.6)
+        self.assertTrue(budget.withdraw())
+        self.assertFalse(budget.withdraw())
+
+
+class CircuitBreakerTestCase(ServerTestCase):
+    '''Test case for ion.requests.CircuitBreaker'''
+    def test_circuit(self):
+        breaker = CircuitBreaker(failure_threshold=2, recovery_time=0.2)
+        requests = Requests(accept_on=[500], circuit_breaker=breaker)
+        host = f'http://127.0.0.1:{self.server.server_port}'
+        self.assertEqual(requests.get(f'{self.base}/status/500').status_code, 500)
+        self.assertEqual(breaker.state(host), 'closed')
+        requests.get(f'{self.base}/status/500')
+        self.assertEqual(breaker.states(), {host: 'open'})
+        with self.assertRaises(CircuitOpenError):
+            requests.get(f'{self.base}/ok')
+        self.assertEqual(requests.get(f'http://localhost:{self.server.server_port}/other').status_code, 200)
+        self.assertNotIn('/ok', self.server.calls)
+        time.sleep(0.25)
+        requests.get(f'{self.base}/status/500')
+        self.assertEqual(breaker.state(host), 'open')
+        time.sleep(0.25)
+        self.assertEqual(requests.get(f'{self.base}/ok').status_code, 200)
+        self.assertEqual(breaker.state(host), 'closed')
+        self.assertEqual(self.server.calls['/status/500'], 3)
+
+    def test_half_open_probes(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_time=0)
+        host = breaker.host('https://Inyourarea.co.uk/news')
+        self.assertEqual(host, 'https://inyourarea.co.uk:443')
+        breaker.record(host, False)
+        breaker.before(host)
+        self.assertEqual(breaker.state(host), 'half-open')
+        with self.assertRaises(CircuitOpenError):
+            breaker.before(host)
+        breaker.record(host, None)
+        breaker.before(host)
+        breaker.record(host, True)
+        self.assertEqual(breaker.state(host), 'closed')
@@ -1,10 +1,16 @@
 '''Testing ion.url'''
 import unittest
+import re
 
 from hypothesis import given
 import hypothesis.strategies as st
 
-from ion.url import parse, domain
+from ion.url import (
+    ParsedUrl, parse, domain, iurl, no_www, query_to_dict, query_to_pairs, query_to_str, make_url,
+    enable_cache, disable_cache, cache_info, iurl_many, domain_many, public_suffix, UrlFrontier,
+    host_batches,
+    _split, URL_REGEX, DEFAULT_SCHEMA
+)
 
 
 DOMAIN_REGEX = r'^[a-zA-Z0-9][a-zA-Z0-9\.\-]*\.[a-zA-Z0-9\.\-]*(?<![\.\-])$'
@@ -34,3 +40,170 @@ class TestUrl(unittest.TestCase):
             domain(_domain, level=None),
             _domain
         )
+
+    @given(st.lists(st.sampled_from([*'aZ9.-:/?#&=% \t\n\xa0é', 'http://', 'https://', 'www.', '.co.uk'])).map(''.join))
+    def test_split_matches_url_regex(self, url):
+        '''ion.url._split should split any input exactly like URL_REGEX does'''
+        match = re.search(URL_REGEX, url)
+        expected = None if match is None else tuple(match.group(component) for component in DEFAULT_SCHEMA)
+        self.assertEqual(_split(url), expected)
+
+    def test_iurl(self):
+        url = 'https://www.inyourarea.co.uk/news/foo-bar/?some=query&other=query2#comments'
+        self.assertEqual(iurl(url), 'inyourarea.co.uk/news/foo-bar')
+        self.assertEqual(iurl(url, query=True), 'inyourarea.co.uk/news/foo-bar/?other=query2&some=query')
+        self.assertEqual(iurl(url, query=['some']), 'inyourarea.co.uk/news/foo-bar/?some=query')
+
+    def test_domain_public_suffixes(self):
+        for url, level, expected in (
+                ('https://www.bbc.co.uk/news', 2, 'bbc.co.uk'),
+                ('https://www.bbc.co.uk/news', 1, 'co.uk'),
+                ('https://www.nzherald.co.nz/nz/', 2, 'nzherald.co.nz'),
+                ('https://www.smh.com.au/national', 2, 'smh.com.au'),
+                ('https://news.sky.com/story', 2, 'sky.com'),
+                ('https://edition.cnn.com/world', 3, 'edition.cnn.com'),
+                ('https://blog.example.wordpress.com/post', 2, 'example.wordpress.com'),
+                ('https://a.b.kawasaki.jp/', 2, 'a.b.kawasaki.jp'),
+                ('https://www.city.kawasaki.jp/', 2, 'city.kawasaki.jp'),
+                ('https://Foo.BBC.co.UK/', 2, 'BBC.co.UK'),
+                ('https://foo.bar.unknowntld/', 2, 'bar.unknowntld'),
+        ):
+            self.assertEqual(domain(url, level=level), expected, url)
+        self.assertEqual(public_suffix('foo.github.io'), 'github.io')
+
+    def test_query(self):
+        url = 'https://max.com/search?q=a%20b+c&tag=x&tag=y&flag&&eq=a=b#top'
+        self.assertEqual(parse(url, 'path query fragment'), '/search?q=a%20b+c&tag=x&tag=y&flag&&eq=a=b#top')
+        self.assertEqual(
+            query_to_pairs(parse(url, 'query')),
+            [('q', 'a%20b+c'), ('tag', 'x'), ('tag', 'y'), ('flag', ''), ('eq', 'a=b')]
+        )
+        self.assertEqual(
+            parse(url, ['query'], as_dict=True)['query'],
+            {'q': 'a%20b+c', 'tag': 'y', 'flag': '', 'eq': 'a=b'}
+        )
+        self.assertEqual(
+            query_to_dict(ParsedUrl(url), decode=True, multi=True),
+            {'q': ['a b c'], 'tag': ['x', 'y'], 'flag': [''], 'eq': ['a=b']}
+        )
+        self.assertEqual(iurl(url, query=True), 'max.com/search?eq=a=b&flag=&q=a%20b+c&tag=x&tag=y')
+
+    @given(st.lists(st.tuples(st.text('ab=%+'), st.text('ab=%+&'))))
+    def test_query_str_round_trip(self, pairs):
+        pairs = [(key.replace('=', ''), value.replace('&', '')) for key, value in pairs]
+        self.assertEqual(query_to_pairs(query_to_str(pairs)), sorted(pairs, key=lambda pair: pair[0]))
+
+
+class ParsedUrlTestCase(unittest.TestCase):
+    '''Testing ion.url.ParsedUrl'''
+    URL = 'https://www.inyourarea.co.uk/news/foo-bar/?some=query&other=query2#comments'
+
+    @given(st.text())
+    def test_matches_string_functions(self, url):
+        parsed = ParsedUrl(url)
+        self.assertEqual(parse(parsed), parse(url))
+        self.assertEqual(parse(parsed, as_dict=True), parse(url, as_dict=True))
+        self.assertEqual(domain(parsed), domain(url))
+
+    def test_parses_once(self):
+        parsed = ParsedUrl(self.URL)
+        parts = parsed.parts
+        self.assertIs(parsed.parts, parts)
+        for query in (False, True, ['some']):
+            self.assertEqual(iurl(parsed, query=query), iurl(self.URL, query=query))
+        self.assertEqual(no_www(parsed), 'https://inyourarea.co.uk/news/foo-bar/?some=query&other=query2#comments')
+        self.assertEqual(query_to_dict(parsed), {'some': 'query', 'other': 'query2'})
+        self.assertEqual(
+            make_url(parsed, {'some': 'other'}),
+            'https://www.inyourarea.co.uk/news/foo-bar/?other=query2&some=other#comments'
+        )
+
+    def test_immutable(self):
+        parsed = ParsedUrl(self.URL)
+        with self.assertRaises(AttributeError):
+            parsed.url = 'max.com'
+        self.assertEqual(parsed, ParsedUrl(self.URL))
+        self.assertEqual(len({parsed, ParsedUrl(self.URL)}), 1)
+
+
+class UrlCacheTestCase(unittest.TestCase):
+    '''Testing ion.url LRU cache of domain and iurl results'''
+    URL = 'https://www.inyourarea.co.uk/news/foo-bar/?some=query&other=query2'
+
+    def tearDown(self):
+        disable_cache()
+
+    def test_cached_results(self):
+        expected = [domain(self.URL), domain(self.URL, level=3), iurl(self.URL, query=['some'])]
+        self.assertIsNone(cache_info())
+        enable_cache(2)
+        for _ in range(2):
+            results = [domain(self.URL), domain(self.URL, level=3), iurl(self.URL, query=['some'])]
+            self.assertEqual(results, expected)
+        self.assertEqual(tuple(cache_info()), (0, 6, 2, 2))
+        self.assertEqual(domain(ParsedUrl(self.URL), level=3), expected[1])
+        self.assertEqual(iurl(self.URL, query=['some']), expected[2])
+        self.assertEqual(cache_info().hits, 2)
+
+
+class ManyTestCase(unittest.TestCase):
+    '''Testing ion.url.iurl_many and ion.url.domain_many'''
+    URLS = [
+        f'https://www.publisher{no % 7}.co.uk/news/article-{no % 13}?page={no % 2}'
+        for no in range(200)
+    ] + ['not a url', None]
+
+    def test_aligned_with_input(self):
+        self.assertEqual(iurl_many(self.URLS, query=True), [iurl(url, query=True) for url in self.URLS])
+        self.assertEqual(domain_many(iter(self.URLS), level=3), [domain(url, level=3) for url in self.URLS])
+
+    def test_processes(self):
+        urls = self.URLS[:-1]
+        self.assertEqual(iurl_many(urls, processes=2, chunksize=10), iurl_many(urls))
+
+
+class HostBatchesTestCase(unittest.TestCase):
+    '''Testing ion.url.host_batches'''
+    URLS = [f'https://www.publisher{no % 4 and no % 7}.co.uk/news/{no}' for no in range(1000)]
+
+    def test_round_robin(self):
+        batches = list(host_batches(self.URLS, batch_size=25))
+        self.assertEqual(sorted(url for _, batch in batches for url in batch), sorted(self.URLS))
+        for host, batch in batches:
+            self.assertTrue(all(domain(url) == host for url in batch))
+            self.assertLessEqual(len(batch), 25)
+        hosts = [host for host, _ in batches]
+        self.assertTrue(all(first != second for first, second in zip(hosts, hosts[1:-10])))
+
+    def test_bounded_buffer(self):
+        consumed = 0
+        def urls():
+            nonlocal consumed
+            for url in self.URLS:
+                consumed += 1
+                yield url
+        emitted = 0
+        for _, batch in host_batches(urls(), batch_size=10, buffer_size=50):
+            emitted += len(batch)
+            self.assertLessEqual(consumed - emitted, 50)
+        self.assertEqual(emitted, len(self.URLS))
+
+
+class UrlFrontierTestCase(unittest.TestCase):
+    '''Testing ion.url.UrlFrontier'''
+    def test_filter(self):
+        urls = [f'https://www.publisher.co.uk/news/{no % 500}/?page={no % 3}' for no in range(2000)]
+        for bloom in (False, True):
+            frontier = UrlFrontier(capacity=100, bloom=bloom)
+            self.assertEqual(list(frontier.filter(urls)), urls[:500])
+            self.assertIn('publisher.co.uk/news/42', frontier)
+            self.assertNotIn('publisher.co.uk/news/500', frontier)
+            frontier = UrlFrontier(bits=128, bloom=bloom, query=True)
+            self.assertEqual(len(list(frontier.filter(urls))), 1500)
+
+    def test_unparsable_urls(self):
+        frontier = UrlFrontier()
+        unparsable = ['not a url', 'also garbage!', 'localhost/foo', 'uk.']
+        self.assertEqual([frontier.add(url) for url in unparsable], [True] * 4)
+        self.assertEqual([frontier.add(url) for url in unparsable], [False] * 4)
+        self.assertNotIn('other garbage', frontier)